@@ -0,0 +1,265 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import openai
+from metrics import AI_HEDGED_REQUESTS, AI_CIRCUIT_OPENED
+
+# =========================
+# RESILIENT AI CLIENT
+# =========================
+# Wraps the OpenAI SDK with explicit connect/read timeouts, a pooled keep-alive HTTP client shared by
+# every call, exponential backoff with full jitter that honours Retry-After, a circuit breaker that
+# fails fast while the provider is degraded (callers then fall back to local summaries) and hedged
+# requests that race a second copy of a call once it runs past the recent p95 latency.
+
+CONNECT_TIMEOUT_SECONDS = 5
+READ_TIMEOUT_SECONDS = 60
+MAX_ATTEMPTS = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20
+# A call never keeps retrying past this, whatever Retry-After says.
+CALL_DEADLINE_SECONDS = 120
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+HEDGE_REQUESTS = True
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 1.0
+HEDGE_INITIAL_DELAY_SECONDS = 10.0
+
+logger = logging.getLogger(__name__)
+
+JSON_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+class AICallError(Exception):
+    # Base class for calls that produced no usable answer; `attempts` is how many requests were made.
+    def __init__(self, message, attempts=0):
+        super().__init__(message)
+        self.attempts = attempts
+
+class ProviderError(AICallError):
+    # The provider kept failing (timeouts, connection errors, 429/5xx) or rejected the request outright.
+    pass
+
+class MalformedResponseError(AICallError):
+    # The provider answered, but not with parseable JSON.
+    def __init__(self, message, attempts=0, content=None):
+        super().__init__(message, attempts)
+        self.content = content
+
+class CircuitOpenError(AICallError):
+    # The circuit breaker is open: the call was not attempted.
+    pass
+
+RETRYABLE_ERRORS = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+def parse_json_content(content):
+    # Parses a JSON answer, tolerating a ```json ... ``` fence around it.
+    if not content:
+        raise ValueError("empty response")
+    text = content.strip()
+    match = JSON_FENCE.match(text)
+    return json.loads(match.group(1) if match else text)
+
+def retry_after_seconds(error):
+    # Server-requested delay from a 429/5xx response (retry-after-ms or retry-after), or None.
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form; fall back to our own backoff
+    return None
+
+def backoff_delay(attempt, rng=random):
+    # Full jitter: uniform in [0, min(max, base * 2^attempt)].
+    return rng.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` consecutive provider failures; open -> half_open after
+    # `reset_seconds`, when a single trial call decides between closing again and re-opening.
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state, self._trial_in_flight = "half_open", False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self._failures, self._trial_in_flight = "closed", 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+                if self.state != "open":
+                    AI_CIRCUIT_OPENED.inc()
+                    logger.warning("AI provider circuit opened after %d consecutive failures", self._failures)
+                self.state, self._opened_at, self._trial_in_flight = "open", time.monotonic(), False
+
+class LatencyTracker:
+    # Recent successful request latencies, for choosing when to hedge.
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self):
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return HEDGE_INITIAL_DELAY_SECONDS
+            samples = sorted(self._samples)
+        return max(HEDGE_MIN_DELAY_SECONDS, samples[int(HEDGE_QUANTILE * (len(samples) - 1))])
+
+class HedgeLosers:
+    # Per-run hook for the slower copies of hedged requests. They are billed too, so each one's usage is
+    # passed to on_usage(usage) when it finishes, on whichever thread finishes it; nothing waits for them.
+    def __init__(self, on_usage):
+        self.on_usage = on_usage
+
+    def add(self, future):
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        usage = future.result().usage
+        if usage:
+            self.on_usage(usage)
+
+class AIClient:
+    def __init__(self, api_key, base_url=None, max_concurrent_calls=8, rate_limiter=None, breaker=None, hedge=HEDGE_REQUESTS,
+                 connect_timeout=CONNECT_TIMEOUT_SECONDS, read_timeout=READ_TIMEOUT_SECONDS, max_attempts=MAX_ATTEMPTS):
+        # One keep-alive connection pool shared by every call; the SDK's own retries are off, retries happen here.
+        # max_concurrent_calls is how many threads call complete_json at once: each may have a hedged copy in
+        # flight too, so the connection and hedge pools hold two requests per caller.
+        # The Limits class is taken from the SDK so it matches the httpx build it uses.
+        max_connections = max_concurrent_calls * 2
+        limits = type(openai.DEFAULT_CONNECTION_LIMITS)(max_connections=max_connections, max_keepalive_connections=max_connections)
+        timeout = openai.Timeout(read_timeout, connect=connect_timeout)
+        self.openai = openai.OpenAI(
+            api_key=api_key, base_url=base_url, max_retries=0, timeout=timeout,
+            http_client=openai.DefaultHttpxClient(limits=limits, timeout=timeout)
+        )
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.max_attempts = max_attempts
+        self.latency = LatencyTracker()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="ai-hedge") if hedge else None
+
+    def complete_json(self, model, system_message, prompt, estimated_tokens=0, hedge_losers=None):
+        # Returns (parsed JSON, raw content, usage, attempts) or raises an AICallError subclass.
+        # The losing copies of hedged requests are handed to `hedge_losers` (a HedgeLosers) when given.
+        messages = [{"role": "system", "content": system_message}, {"role": "user", "content": prompt}]
+        deadline = time.monotonic() + CALL_DEADLINE_SECONDS
+        content, malformed = None, 0
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError("AI provider circuit is open", attempt)
+            healthy, retry_error = False, None
+            try:
+                response = self._send(model, messages, estimated_tokens, hedge_losers)
+                content = response.choices[0].message.content
+                healthy = True
+            except RETRYABLE_ERRORS as e:
+                retry_error = e
+            except openai.APIStatusError as e:
+                # 4xx other than 429: retrying the same request won't help. The provider did answer, so the breaker counts it as healthy.
+                healthy = True
+                raise ProviderError(f"{type(e).__name__}: {e}", attempt + 1) from e
+            except Exception as e:
+                # Anything else (an unexpected SDK error, a response without choices) fails this call like a provider error.
+                raise ProviderError(f"Unexpected {type(e).__name__}: {e}", attempt + 1) from e
+            finally:
+                # Every attempt settles the breaker, so a half-open trial can't stay in flight forever.
+                if healthy:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+            if retry_error:
+                delay = retry_after_seconds(retry_error) or backoff_delay(attempt)
+                if attempt + 1 >= self.max_attempts or time.monotonic() + delay > deadline:
+                    raise ProviderError(f"{type(retry_error).__name__}: {retry_error}", attempt + 1) from retry_error
+                logger.warning("AI call attempt %d failed (%s); retrying in %.2fs", attempt + 1, type(retry_error).__name__, delay)
+                # The backoff sleeps on the caller's thread, so a retrying call keeps its worker slot. That is deliberate:
+                # retries only happen while the provider is throttling or failing, when handing the slot to another call
+                # would mostly earn it the same 429/5xx. The deadline above bounds how long a slot can be held.
+                time.sleep(delay)
+                continue
+            logger.debug("AI raw output (attempt %d):\n%s", attempt + 1, content)
+            try:
+                return parse_json_content(content), content, response.usage, attempt + 1
+            except ValueError as e:
+                # Malformed output is retried once at most; with temperature 0 it rarely changes after that.
+                malformed += 1
+                if malformed > 1 or attempt + 1 >= self.max_attempts:
+                    raise MalformedResponseError(f"Response is not valid JSON: {e}", attempt + 1, content) from e
+                logger.warning("AI call attempt %d returned malformed JSON; retrying", attempt + 1)
+        raise MalformedResponseError("Response is not valid JSON", self.max_attempts, content)
+
+    def _send(self, model, messages, estimated_tokens, hedge_losers=None):
+        # One request, hedged with a second copy when it runs past the recent p95 latency. The rate limit is
+        # acquired first and the hedge delay counts from when the request is actually sent, so neither a
+        # rate-limit wait nor queueing for a pool thread can trigger a hedge.
+        if self.rate_limiter:
+            self.rate_limiter.acquire(estimated_tokens)
+        if not self.hedge:
+            return self._request(model, messages)
+        sent = threading.Event()
+        primary = self._hedge_pool.submit(self._request, model, messages, sent)
+        sent.wait()
+        done, _ = wait([primary], timeout=self.latency.hedge_delay())
+        # The second copy is only sent if the rate limit has room for it right now.
+        if done or (self.rate_limiter and not self.rate_limiter.try_acquire(estimated_tokens)):
+            return primary.result()
+        AI_HEDGED_REQUESTS.inc()
+        secondary = self._hedge_pool.submit(self._request, model, messages)
+        error = None
+        for future in as_completed([primary, secondary]):
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if hedge_losers is not None:
+                hedge_losers.add(secondary if future is primary else primary)
+            return response
+        raise error
+
+    def _request(self, model, messages, sent=None):
+        if sent:
+            sent.set()
+        started = time.perf_counter()
+        response = self.openai.chat.completions.create(model=model, messages=messages, temperature=0)
+        self.latency.add(time.perf_counter() - started)
+        return response
@@ -1,12 +1,22 @@
-import json
+import logging
 import time
-from openai import OpenAI
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config import RULES
 from event_generator import PERSONS
-from analyzer import analyze_person_journey_locally
+from analyzer import analyze_events_batch
+from summary_cache import SummaryCache, CacheCounter
+from ingest import iter_events_file
+from ai_client import AIClient, AICallError, CircuitOpenError, MalformedResponseError, HedgeLosers
+from daily_summary import DailySummarizer
+from sites import site_registry, analyze_sites, ANALYSIS_WORKERS
+from prompts import get_batch_incident_summary_prompt, build_flagged_incidents
+from metrics import (timed, Trace, AI_CALL_SECONDS, AI_CALLS, AI_RETRIES, AI_TOKENS, CACHE_LOOKUPS,
+                     RATE_LIMIT_WAITS, RATE_LIMIT_WAIT_SECONDS, RUNS, EVENTS_PROCESSED)
 
-# --- DEBUG FLAG ---
-DEBUG = True
+# Prompts and raw model output are logged at DEBUG level (e.g. LOG_LEVEL=DEBUG python main.py).
+logger = logging.getLogger(__name__)
 
 def get_api_key():
     # Reads the API key from the data/token file.
@@ -14,141 +24,437 @@ def get_api_key():
         with open("data/token") as f:
             return f.read().strip()
     except FileNotFoundError:
-        print("ERROR: `data/token` file not found. Please create it and add your OpenAI API key.")
+        logger.error("`data/token` file not found. Please create it and add your OpenAI API key.")
         return None
 
-api_key = get_api_key()
-client = OpenAI(api_key=api_key) if api_key else None
-
 MODEL_NAME = "gpt-4o-mini"
 COST_INPUT_PER_MILLION_TOKENS = 0.60
 COST_OUTPUT_PER_MILLION_TOKENS = 2.40
 
-def _make_ai_call_with_retry(prompt, system_message, retries=1):
+# --- Concurrency & rate limits ---
+MAX_CONCURRENT_AI_CALLS = 8
+# Sites whose summaries are produced at the same time by process_sites.
+MAX_CONCURRENT_SITES = 4
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+EXPECTED_OUTPUT_TOKENS = 400
+
+INCIDENT_SYSTEM_MESSAGE = "You are a security AI writing an incident summary in JSON."
+DAILY_SYSTEM_MESSAGE = "You are a security manager creating a daily report in JSON."
+BATCH_SYSTEM_MESSAGE = "You are a security AI writing incident summaries for several people in JSON."
+# Metric label for each kind of AI call.
+AI_CALL_KINDS = {INCIDENT_SYSTEM_MESSAGE: "incident", DAILY_SYSTEM_MESSAGE: "daily_summary", BATCH_SYSTEM_MESSAGE: "batch"}
+
+# --- Incident batching ---
+# Packs several incidents into one request so the instructions are only paid for once.
+BATCH_INCIDENTS = True
+BATCH_TOKEN_BUDGET = 6000
+MAX_INCIDENTS_PER_BATCH = 10
+
+class RateLimiter:
+    # Sliding one-minute window over requests and tokens, shared by all worker threads.
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._window = deque()  # (timestamp, tokens) per request sent in the last minute
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        # Blocks the calling worker until the request fits in both budgets.
+        started = None
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self._take(now, tokens):
+                    if started is not None:
+                        RATE_LIMIT_WAITS.inc()
+                        RATE_LIMIT_WAIT_SECONDS.inc(now - started)
+                    return
+                wait = 60 - (now - self._window[0][0])
+                started = now if started is None else started
+            time.sleep(max(wait, 0.01))
+
+    def try_acquire(self, tokens):
+        # Like acquire, but returns False instead of waiting when the request doesn't fit (used for hedged copies).
+        with self._lock:
+            return self._take(time.monotonic(), tokens)
+
+    def _take(self, now, tokens):
+        # Records the request in the window if it fits in both budgets; call with the lock held.
+        while self._window and now - self._window[0][0] >= 60:
+            self._tokens_in_window -= self._window.popleft()[1]
+        fits_requests = len(self._window) < self.requests_per_minute
+        # A single oversized request is let through on an empty window so it can't wait forever.
+        fits_tokens = not self._window or self._tokens_in_window + tokens <= self.tokens_per_minute
+        if not (fits_requests and fits_tokens):
+            return False
+        self._window.append((now, tokens))
+        self._tokens_in_window += tokens
+        return True
+
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+def create_client(api_key, base_url=None):
+    # base_url points the client at an OpenAI-compatible server (e.g. stub_openai.py for benchmarks).
+    # process_sites runs up to MAX_CONCURRENT_SITES sites at once, each with MAX_CONCURRENT_AI_CALLS workers.
+    return AIClient(api_key, base_url, max_concurrent_calls=MAX_CONCURRENT_AI_CALLS * MAX_CONCURRENT_SITES, rate_limiter=rate_limiter)
+
+api_key = get_api_key()
+client = create_client(api_key) if api_key else None
+
+# --- Summary cache ---
+# Identical prompts (e.g. re-analysing the same day's data) are answered from disk instead of the model.
+SUMMARY_CACHE_ENABLED = True
+summary_cache = SummaryCache()
+
+class RunUsage:
+    # A run's token totals and their cost, safe to update from any thread. Usage that arrives after the run
+    # has returned (the losing copies of hedged requests) is still added: the usage_stats dicts handed out by
+    # stats() are updated in place, and so is the parent's (process_sites sums its sites this way).
+    def __init__(self, parent=None):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.parent = parent
+        self._stats = []
+        self._lock = threading.Lock()
+
+    def add(self, usage):
+        if not usage:
+            return
+        with self._lock:
+            self.input_tokens += usage.prompt_tokens
+            self.output_tokens += usage.completion_tokens
+            for stats in self._stats:
+                stats.update(self._totals())
+        if self.parent:
+            self.parent.add(usage)
+
+    def stats(self, **extra):
+        # A usage_stats dict with the current totals plus `extra`, kept up to date by later add() calls.
+        with self._lock:
+            stats = {"model": MODEL_NAME, **self._totals(), **extra}
+            self._stats.append(stats)
+        return stats
+
+    def _totals(self):
+        input_cost = (self.input_tokens / 1_000_000) * COST_INPUT_PER_MILLION_TOKENS
+        output_cost = (self.output_tokens / 1_000_000) * COST_OUTPUT_PER_MILLION_TOKENS
+        return {
+            "input_tokens": self.input_tokens, "output_tokens": self.output_tokens, "total_tokens": self.input_tokens + self.output_tokens,
+            "input_cost": f"{input_cost:.6f}", "output_cost": f"{output_cost:.6f}", "total_cost": f"{input_cost + output_cost:.6f}"
+        }
+
+def _hedge_losers(run_usage):
+    # The losing copies of hedged requests count towards the token metrics and the run's usage once they finish.
+    def count(usage):
+        AI_TOKENS.inc(usage.prompt_tokens, direction="input")
+        AI_TOKENS.inc(usage.completion_tokens, direction="output")
+        run_usage.add(usage)
+    return HedgeLosers(count)
+
+def estimate_tokens(text):
+    # Rough token estimate (~4 characters per token) used for rate limiting before the call is made.
+    return len(text) // 4 + 1
+
+def _observe_ai_call(kind, outcome, started, attempts=0, usage=None, trace=None):
+    # Records one AI call (including its retries) in the metrics and, when tracing, in the run's trace.
+    elapsed = time.perf_counter() - started
+    AI_CALLS.inc(kind=kind, outcome=outcome)
+    AI_CALL_SECONDS.observe(elapsed, kind=kind)
+    if attempts > 1:
+        AI_RETRIES.inc(attempts - 1, kind=kind)
+    if usage:
+        AI_TOKENS.inc(usage.prompt_tokens, direction="input")
+        AI_TOKENS.inc(usage.completion_tokens, direction="output")
+    if trace is not None:
+        trace.add("ai_call", elapsed, started, kind=kind, outcome=outcome, attempts=attempts,
+                  input_tokens=usage.prompt_tokens if usage else 0, output_tokens=usage.completion_tokens if usage else 0)
+
+def _make_ai_call_with_retry(prompt, system_message, cache_counter=None, expected_output_tokens=EXPECTED_OUTPUT_TOKENS, validate=None, record=None, trace=None,
+                             hedge_losers=None):
+    # Returns (parsed_json, usage), or (None, None) when no usable answer was obtained (the caller falls back to a local summary).
+    # Cache hits return no usage since no tokens were spent. Retries, backoff, hedging and the circuit breaker live in AIClient.
+    # Responses failing validate(parsed) are still returned but never cached.
+    # When a RunRecord is given, the exchange (prompt, raw response, usage) is logged to it.
+    # When a Trace is given, the call is added to it as an "ai_call" span.
+    # When a HedgeLosers is given, the slower copies of hedged requests are handed to it so the run can count their usage.
+    kind = AI_CALL_KINDS.get(system_message, "other")
+    started = time.perf_counter()
+    use_cache = cache_counter is not None and cache_counter.enabled
+    if use_cache:
+        cached = summary_cache.get(MODEL_NAME, system_message, prompt)
+        cache_counter.record(hit=cached is not None)
+        CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        if cached is not None:
+            if record: record.record_exchange(system_message, prompt, None, cached=True)
+            _observe_ai_call(kind, "cached", started, trace=trace)
+            return cached, None
     if not client:
         return None, None
-    if DEBUG:
-        print("\n----- AI PROMPT -----\n")
-        print(prompt)
-        print("\n---------------------\n")
-    for i in range(retries + 1):
-        try:
-            response = client.chat.completions.create(model=MODEL_NAME, messages=[{"role": "system", "content": system_message}, {"role": "user", "content": prompt}], temperature=0)
-            content = response.choices[0].message.content
-            if DEBUG:
-                print(f"\n----- AI RAW OUTPUT (Attempt {i+1}) -----\n")
-                print(content)
-                print("\n----------------------------------\n")
-            if content:
-                if content.strip().startswith("```json"):
-                    content = content.strip()[7:-3]
-                return json.loads(content), response.usage
-        except Exception as e:
-            print(f"AI call attempt {i+1} failed. Error: {e}")
-            if i < retries:
-                time.sleep(1)
-    return None, None
-
-def get_incident_summary_prompt(person_id, authorized_zones, local_analysis, events):
-    # Generates the prompt for the AI to act as a storyteller for an incident.
-    event_text = "\n".join([f"{e['timestamp']} | {e['event_type']} in {e['zone']}" for e in events])
-    # NEW: Instruct the AI to use a placeholder.
-    return f"""A security analysis for person ID '{person_id}' has flagged violations with a risk score of {local_analysis['risk_score']}.
-This person is authorized for the following zones: {authorized_zones}.
-The detected violations are:
-- {local_analysis['issues']}
-
-Based on the full event log below, write a human-readable narrative summary and provide actionable recommendations.
-IMPORTANT: In your response, use the placeholder '[PERSON_NAME]' instead of the person's actual ID.
-
-Event Log:
-{event_text}
-
-Respond with a single JSON object with two keys:
-1. "summary": A narrative of the person's journey (e.g., "[PERSON_NAME] entered the warehouse at...").
-2. "recommendation": A list of brief, actionable steps (e.g., "Issue a formal warning to [PERSON_NAME]")."""
-
-def get_daily_summary_prompt(incidents):
-    # Generates the analytical prompt for the daily summary.
-    if not incidents:
-        return None
-    
-    incidents_for_prompt = []
-    for i in incidents:
-        issues_dict = {v["type"]: v["zone"] for v in i["violations"]}
-        incidents_for_prompt.append({
-            "person_id": i["person_id"],
-            "issues": issues_dict
-        })
+    logger.debug("AI prompt (%s):\n%s", kind, prompt)
+    estimated_tokens = estimate_tokens(system_message) + estimate_tokens(prompt) + expected_output_tokens
+    try:
+        parsed, content, usage, attempts = client.complete_json(MODEL_NAME, system_message, prompt, estimated_tokens, hedge_losers)
+    except AICallError as e:
+        outcome = "circuit_open" if isinstance(e, CircuitOpenError) else "malformed" if isinstance(e, MalformedResponseError) else "failed"
+        if not isinstance(e, CircuitOpenError):
+            logger.warning("AI call (%s) failed after %d attempt(s): %s", kind, e.attempts, e)
+        if record: record.record_exchange(system_message, prompt, getattr(e, "content", None), attempts=e.attempts)
+        _observe_ai_call(kind, outcome, started, e.attempts, trace=trace)
+        return None, None
+    if use_cache and (validate is None or validate(parsed)):
+        summary_cache.put(MODEL_NAME, system_message, prompt, parsed)
+    if record: record.record_exchange(system_message, prompt, content, usage, attempts=attempts)
+    _observe_ai_call(kind, "ok", started, attempts, usage, trace)
+    return parsed, usage
 
-    return f"""You are a security shift supervisor analyzing all incidents from the day. Your task is to identify patterns and provide a high-level analytical summary.
+def parse_batch_response(parsed, person_ids):
+    # Returns {person_id: {"summary", "recommendation"}} for the well-formed entries of a batch response.
+    summaries = {}
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("incidents"), list):
+        return summaries
+    for entry in parsed["incidents"]:
+        if not isinstance(entry, dict) or entry.get("person_id") not in person_ids:
+            continue
+        if isinstance(entry.get("summary"), str) and isinstance(entry.get("recommendation"), list):
+            summaries[entry["person_id"]] = {"summary": entry["summary"], "recommendation": entry["recommendation"]}
+    return summaries
 
-Today's Incidents:
-{json.dumps(incidents_for_prompt, indent=2)}
+def plan_batches(block_tokens, token_budget=BATCH_TOKEN_BUDGET, max_size=MAX_INCIDENTS_PER_BATCH):
+    # Greedily packs incidents, in order, into batches whose estimated prompt size stays within the token budget.
+    # An incident bigger than the whole budget gets a batch of its own.
+    overhead = estimate_tokens(get_batch_incident_summary_prompt([]))
+    batches, current, current_tokens = [], [], overhead
+    for index, tokens in enumerate(block_tokens):
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_size):
+            batches.append(current)
+            current, current_tokens = [], overhead
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
 
-Based on the data, respond with a single JSON object with two keys:
-1. "summary": An analytical overview object with keys "offenders" (a list of objects with "person_id" and "violations"), "hot_spot_zones", and "common_violations".
-2. "actionable_items": A list of objects with well argumented actionable recomendations, where each object has an "action" and other relevant details."""
+def _summarize_one(index, prompt, cache_counter, record=None, trace=None, hedge_losers=None):
+    # Work unit for a single incident: returns ([(index, ai_summary)], usages, batch_record).
+    ai_summary, usage = _make_ai_call_with_retry(prompt, INCIDENT_SYSTEM_MESSAGE, cache_counter=cache_counter, record=record, trace=trace,
+                                                 hedge_losers=hedge_losers)
+    return [(index, ai_summary)], [usage], None
 
-def process_all_events(json_file="data/warehouse_events.json"):
-    # The main processing pipeline with local-first analysis and AI calls for natural language summary.
-    with open(json_file) as f:
-        events = json.load(f)
-
-    events_by_person = {p["id"]: [] for p in PERSONS}
-    for event in events:
-        if event["person_id"] in events_by_person:
-            events_by_person[event["person_id"]].append(event)
-
-    person_details_map = {p["id"]: p for p in PERSONS}
-    all_incidents = []
-    total_input_tokens, total_output_tokens = 0, 0
-
-    for person_id, person_events in events_by_person.items():
-        if not person_events: continue
-        local_analysis = analyze_person_journey_locally(person_events)
-        
-        if local_analysis:
-            person_info = person_details_map[person_id]
-            prompt = get_incident_summary_prompt(person_id, person_info["authorized_zones"], local_analysis, person_events)
-            ai_summary, usage = _make_ai_call_with_retry(prompt, "You are a security AI writing an incident summary in JSON.")
-            
-            if usage:
-                total_input_tokens += usage.prompt_tokens
-                total_output_tokens += usage.completion_tokens
-            
-            # Substitute the [PERSON_NAME] placeholder with the actual name
-            if ai_summary and ai_summary.get("summary"):
-                ai_summary["summary"] = ai_summary["summary"].replace("[PERSON_NAME]", person_info["name"])
-            if ai_summary and ai_summary.get("recommendation"):
-                ai_summary["recommendation"] = [rec.replace("[PERSON_NAME]", person_info["name"]) for rec in ai_summary["recommendation"]]
-
-            full_incident = {
-                "person_id": person_id,
-                "person_name": person_info["name"],
-                **local_analysis,
-                **(ai_summary or {"summary": "AI summary failed.", "recommendation": "Review logs."})
-            }
-            all_incidents.append(full_incident)
-
-    summary_prompt = get_daily_summary_prompt(all_incidents)
-    summary_data, summary_usage = {"summary": "No incidents to summarize.", "actionable_items": []}, None
-    if summary_prompt:
-        summary_data, summary_usage = _make_ai_call_with_retry(summary_prompt, "You are a security manager creating a daily report in JSON.")
-        if summary_usage:
-            total_input_tokens += summary_usage.prompt_tokens
-            total_output_tokens += summary_usage.completion_tokens
-
-    input_cost = (total_input_tokens / 1_000_000) * COST_INPUT_PER_MILLION_TOKENS
-    output_cost = (total_output_tokens / 1_000_000) * COST_OUTPUT_PER_MILLION_TOKENS
+def _summarize_batch(items, cache_counter, record=None, trace=None, hedge_losers=None):
+    # Work unit for a batch of (index, person_id, prompt, block). Entries missing or malformed in the
+    # batch response fall back to single-incident calls.
+    person_ids = {person_id for _, person_id, _, _ in items}
+    prompt = get_batch_incident_summary_prompt([block for _, _, _, block in items])
+    parsed, usage = _make_ai_call_with_retry(
+        prompt, BATCH_SYSTEM_MESSAGE, cache_counter=cache_counter, record=record, trace=trace, hedge_losers=hedge_losers,
+        expected_output_tokens=EXPECTED_OUTPUT_TOKENS * len(items),
+        validate=lambda p: len(parse_batch_response(p, person_ids)) == len(person_ids)
+    )
+    summaries = parse_batch_response(parsed, person_ids)
+    batch_record = {
+        "size": len(items), "input_tokens": usage.prompt_tokens if usage else 0,
+        "output_tokens": usage.completion_tokens if usage else 0, "cached": parsed is not None and usage is None,
+        "fallbacks": 0, "fallback_input_tokens": 0, "fallback_output_tokens": 0
+    }
+    results, usages = [], [usage]
+    for index, person_id, single_prompt, _ in items:
+        if person_id in summaries:
+            results.append((index, summaries[person_id]))
+            continue
+        ai_summary, single_usage = _make_ai_call_with_retry(single_prompt, INCIDENT_SYSTEM_MESSAGE, cache_counter=cache_counter, record=record, trace=trace,
+                                                            hedge_losers=hedge_losers)
+        batch_record["fallbacks"] += 1
+        if single_usage:
+            batch_record["fallback_input_tokens"] += single_usage.prompt_tokens
+            batch_record["fallback_output_tokens"] += single_usage.completion_tokens
+        usages.append(single_usage)
+        results.append((index, ai_summary))
+    return results, usages, batch_record
 
+def _summarize_incidents(flagged, max_concurrency, on_result=None, cache_counter=None, batch_incidents=BATCH_INCIDENTS, record=None, trace=None,
+                         hedge_losers=None):
+    # Summarizes the flagged incidents on a bounded worker pool, one request per incident or per batch.
+    # Returns (summaries in the same order as `flagged`, usages, batch_records).
+    # on_result(index, ai_summary) fires as soon as each summary is ready, in completion order.
+    if batch_incidents:
+        items = [(index, item["person_id"], item["prompt"], item["block"]) for index, item in enumerate(flagged)]
+        batches = plan_batches([estimate_tokens(item["block"]) for item in flagged])
+        # A batch of one is just a single-incident call; the plain prompt is shorter.
+        units = [(_summarize_batch, [items[i] for i in batch], cache_counter, record, trace, hedge_losers) if len(batch) > 1 else (_summarize_one, batch[0], items[batch[0]][2], cache_counter, record, trace, hedge_losers) for batch in batches]
+    else:
+        units = [(_summarize_one, index, item["prompt"], cache_counter, record, trace, hedge_losers) for index, item in enumerate(flagged)]
+
+    summaries, usages, batch_records = [None] * len(flagged), [], []
+    def collect(unit_result):
+        results, unit_usages, batch_record = unit_result
+        usages.extend(unit_usages)
+        if batch_record: batch_records.append(batch_record)
+        for index, ai_summary in results:
+            summaries[index] = ai_summary
+            if on_result: on_result(index, ai_summary)
+
+    if max_concurrency <= 1 or len(units) <= 1:
+        for fn, *args in units:
+            collect(fn(*args))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(units))) as executor:
+            for future in as_completed([executor.submit(fn, *args) for fn, *args in units]):
+                collect(future.result())
+    return summaries, usages, batch_records
+
+# --- Local fallbacks ---
+# Templated incident reports built from the local analysis alone, used when the AI call fails or the
+# circuit breaker is open, so every incident still gets a readable summary.
+LOCAL_VIOLATION_TEXT = {
+    "unauthorized_access": ("entered the {zone} without authorization", "Review {name}'s access to the {zone} and confirm whether the entry was approved."),
+    "loitering": ("stayed in the {zone} longer than allowed", "Ask {name} to explain the extended stay in the {zone}."),
+    "after_hours_access": ("accessed the {zone} outside operating hours", "Verify whether {name} had approval for after-hours work in the {zone}."),
+}
+LOCAL_DEFAULT_TEXT = ("triggered {type} in the {zone}", "Review the {type} violation by {name} in the {zone}.")
+
+def local_incident_summary(person_info, local_analysis):
+    name = person_info["name"]
+    texts = [(LOCAL_VIOLATION_TEXT.get(v["type"], LOCAL_DEFAULT_TEXT), v) for v in local_analysis["violations"]]
+    findings = "; ".join(summary.format(name=name, **v) for (summary, _), v in texts)
     return {
+        "summary": f"{name} {findings} (risk score {local_analysis['risk_score']}). Generated locally: the AI summary was unavailable.",
+        "recommendation": list(dict.fromkeys(rec.format(name=name, **v) for (_, rec), v in texts))
+    }
+
+def summarize_day(incidents, summarizer=None, cache_counter=None, record=None, trace=None, hedge_losers=None):
+    # Folds the incidents into the day's running aggregates and asks the model to update the actionable items
+    # from the delta only. Returns (daily report, usage); no call is made when nothing changed.
+    summarizer = summarizer or DailySummarizer()
+    with summarizer.lock:
+        prompt = summarizer.prepare(incidents)
+        if record: record.prompts["daily_summary_prompt"] = prompt
+        if not prompt:
+            return summarizer.report(), None
+        with timed("daily_summary", trace):
+            parsed, usage = _make_ai_call_with_retry(
+                prompt, DAILY_SYSTEM_MESSAGE, cache_counter=cache_counter, record=record, trace=trace, hedge_losers=hedge_losers,
+                validate=lambda p: isinstance(p, dict) and isinstance(p.get("actionable_items"), list)
+            )
+        return summarizer.apply(parsed), usage
+
+def _build_incident(person_info, local_analysis, ai_summary):
+    # Merges the local analysis with the AI narrative, substituting the [PERSON_NAME] placeholder with the actual name.
+    # Without an AI summary the incident gets a locally templated one.
+    if ai_summary and ai_summary.get("summary"):
+        ai_summary["summary"] = ai_summary["summary"].replace("[PERSON_NAME]", person_info["name"])
+    if ai_summary and ai_summary.get("recommendation"):
+        ai_summary["recommendation"] = [rec.replace("[PERSON_NAME]", person_info["name"]) for rec in ai_summary["recommendation"]]
+
+    return {
+        "person_id": person_info["id"],
+        "person_name": person_info["name"],
+        **local_analysis,
+        **(ai_summary or local_incident_summary(person_info, local_analysis)),
+        "summary_source": "ai" if ai_summary else "local"
+    }
+
+def process_all_events(json_file="data/warehouse_events.json", max_concurrency=MAX_CONCURRENT_AI_CALLS, on_incident=None,
+                       use_cache=SUMMARY_CACHE_ENABLED, batch_incidents=BATCH_INCIDENTS, record=None, events=None, trace=False,
+                       daily_summarizer=None, site=None, flagged=None, total_usage=None):
+    # The main processing pipeline with local-first analysis and AI calls for natural language summary.
+    # on_incident(incident) is called as each incident summary becomes ready, for streaming to clients.
+    # use_cache=False bypasses the summary cache and always calls the model.
+    # batch_incidents=False sends one request per flagged person instead of packing them into batches.
+    # Reads either a JSON array file or NDJSON (.ndjson / .jsonl), unless the events are passed in directly.
+    # Pass a RunRecord to keep the run's intermediate artifacts (grouped events, analyses, prompts, AI exchanges).
+    # trace=True adds per-stage and per-AI-call timings to usage_stats["trace"].
+    # Pass a DailySummarizer to fold this run into a running daily report instead of summarizing it from scratch.
+    # site: the Site whose personnel and rules apply (the config warehouse when omitted).
+    # flagged: the flagged incidents when already built (see prompts.build_flagged_incidents), e.g. by the
+    # analysis workers of process_sites; the events are then only counted.
+    # total_usage: a RunUsage this run's tokens are also added to.
+    persons = site.persons if site else PERSONS
+    run_trace = Trace() if trace else None
+    if events is None:
+        with timed("load", run_trace):
+            events = list(iter_events_file(json_file))
+
+    run_usage = RunUsage(parent=total_usage)
+    cache_counter = CacheCounter(enabled=use_cache)
+    hedge_losers = _hedge_losers(run_usage)
+
+    if flagged is None:
+        with timed("group", run_trace):
+            events_by_person = {p["id"]: [] for p in persons}
+            for event in events:
+                if event["person_id"] in events_by_person:
+                    events_by_person[event["person_id"]].append(event)
+
+        # Local analysis (vectorized over everyone at once) and prompt building are cheap, so do them up front in person order.
+        with timed("analyze", run_trace):
+            local_analyses = analyze_events_batch(events, site.registry) if site else analyze_events_batch(events)
+        with timed("prompt_build", run_trace):
+            flagged = build_flagged_incidents(persons, events_by_person, local_analyses, batch_incidents)
+        if record:
+            record.events_by_person = events_by_person
+            record.local_analyses = local_analyses
+
+    if record:
+        record.events = events
+        record.prompts.update({f"incident_prompt_{item['person_info']['name']}": item["prompt"] for item in flagged})
+
+    all_incidents = [None] * len(flagged)
+    def collect(index, ai_summary):
+        all_incidents[index] = _build_incident(flagged[index]["person_info"], flagged[index]["local_analysis"], ai_summary)
+        if on_incident: on_incident(all_incidents[index])
+
+    with timed("incident_summaries", run_trace, incidents=len(flagged)):
+        _, usages, batch_records = _summarize_incidents(flagged, max_concurrency, on_result=collect, cache_counter=cache_counter,
+                                                        batch_incidents=batch_incidents, record=record, trace=run_trace, hedge_losers=hedge_losers)
+
+    summary_data, summary_usage = summarize_day(all_incidents, daily_summarizer, cache_counter=cache_counter, record=record, trace=run_trace,
+                                                hedge_losers=hedge_losers)
+    usages.append(summary_usage)
+    for usage in usages:
+        run_usage.add(usage)
+
+    RUNS.inc()
+    EVENTS_PROCESSED.inc(len(events))
+
+    result = {
         "analysis": all_incidents,
-        "daily_summary": summary_data or {"summary": "AI summary generation failed.", "actionable_items": ["Check logs."]},
+        "daily_summary": summary_data,
         "events": events,
-        "usage_stats": {
-            "model": MODEL_NAME, "input_tokens": total_input_tokens, "output_tokens": total_output_tokens,
-            "total_tokens": total_input_tokens + total_output_tokens, "input_cost": f"{input_cost:.6f}",
-            "output_cost": f"{output_cost:.6f}", "total_cost": f"{input_cost + output_cost:.6f}"
-        }
+        "usage_stats": run_usage.stats(cache=cache_counter.to_dict(), batches=batch_records)
+    }
+    if run_trace:
+        result["usage_stats"]["trace"] = run_trace.to_list()
+    return result
+
+def process_sites(body, sites=site_registry, workers=ANALYSIS_WORKERS, max_concurrent_sites=MAX_CONCURRENT_SITES,
+                  use_cache=SUMMARY_CACHE_ENABLED, batch_incidents=BATCH_INCIDENTS, trace=False):
+    # Multi-site pipeline over an NDJSON body: local analysis and prompt building are sharded by site and
+    # person across worker processes (sites.analyze_sites), then each site's summaries run through
+    # process_all_events concurrently. All sites share the AI client, so its rate limiter and connection
+    # pool bound the total model traffic.
+    # Returns per-site results under "sites", plus every incident (tagged with its site_id) and summed usage.
+    run_trace = Trace() if trace else None
+    with timed("analyze", run_trace):
+        analyses = analyze_sites(body, sites, workers, batch_incidents)
+
+    results, total_usage = {}, RunUsage()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrent_sites, len(analyses)))) as pool:
+        futures = {site_id: pool.submit(process_all_events, events=[], site=sites.get(site_id), flagged=flagged,
+                                        use_cache=use_cache, batch_incidents=batch_incidents, trace=trace, total_usage=total_usage)
+                   for site_id, (flagged, _) in analyses.items()}
+        for site_id, future in futures.items():
+            results[site_id] = future.result()
+            del results[site_id]["events"]
+    EVENTS_PROCESSED.inc(sum(count for _, count in analyses.values()))
+
+    result = {
+        "sites": results,
+        "analysis": [{"site_id": site_id, **incident} for site_id, site_result in results.items() for incident in site_result["analysis"]],
+        "usage_stats": total_usage.stats(cache={key: sum(site_result["usage_stats"]["cache"][key] for site_result in results.values())
+                                                for key in ("hits", "misses")})
     }
+    if run_trace:
+        result["usage_stats"]["trace"] = run_trace.to_list()
+    return result
@@ -1,51 +1,156 @@
-from config import RULES
+import numpy as np
+from rules import default_registry
 
-def analyze_person_journey_locally(events):
-    # Analyzes a person's event journey locally to detect violations and calculate a risk score.
-    violations = []
-    
-    for event in events:
-        # Check for unauthorized access on entry
-        if event['event_type'] == 'person_entered' and not event['authorized']:
-            violations.append({"type": "unauthorized_access", "zone": event["zone"]})
-            
-        # Check for loitering on exit
-        if event['event_type'] == 'person_exited' and event.get('duration_minutes', 0) > event.get('allowed_minutes', 5):
-            violations.append({"type": "loitering", "zone": event["zone"]})
-            
-        # Check for after-hours access
-        ts = event['timestamp']
-        hour = int(ts[11:13])
-        if hour < 8 or hour >= 18:
-            # To avoid spam, we only add one after-hours violation per journey
-            if not any(v['type'] == 'after_hours_access' for v in violations):
-                violations.append({"type": "after_hours_access", "zone": event["zone"]})
-
-    if not violations:
-        return None
+def detect_event_violations(event, reported, registry=default_registry):
+    # Returns the violations a single event triggers, in rule declaration order.
+    # `reported` is the journey's set of dedupe keys (e.g. the once-per-journey after-hours rule) and is updated in place.
+    return registry.evaluate(event, reported)
 
-    # --- Calculate Risk Score ---
+def calculate_risk_score(violation_counts, registry=default_registry):
+    # Scores a journey from its per-type violation counts.
     total_score = 0
-    issue_types_found = set()
-    
-    # Create a count of each violation type
-    violation_counts = {}
-    for v in violations:
-        violation_counts[v["type"]] = violation_counts.get(v["type"], 0) + 1
-        issue_types_found.add(v["type"])
 
     # Calculate score based on counts
     for issue_type, count in violation_counts.items():
-        if issue_type in RULES:
-            base = RULES[issue_type]['penalty']
+        if issue_type in registry.penalties:
+            base = registry.penalties[issue_type]
             total_score += base * (1 + (count - 1) * 0.5)
 
     # Apply cross-category multiplier
-    if len(issue_types_found) > 1:
+    if len(violation_counts) > 1:
         total_score *= 1.2
 
+    return int(total_score)
+
+class JourneyState:
+    # Incremental analysis state for one person: updated one event at a time, so it can follow a live feed.
+    # Memory grows with the number of violations, not events; max_violations caps the stored details
+    # (the counts, and therefore the risk score, stay exact).
+    __slots__ = ("violations", "violation_counts", "reported", "events_seen", "max_violations", "registry")
+
+    def __init__(self, max_violations=None, registry=default_registry):
+        self.violations = []
+        self.violation_counts = {}
+        self.reported = set()
+        self.events_seen = 0
+        self.max_violations = max_violations
+        self.registry = registry
+
+    def update(self, event):
+        # Applies one event and returns the new violations it triggered.
+        self.events_seen += 1
+        new_violations = detect_event_violations(event, self.reported, self.registry)
+        for v in new_violations:
+            self.violation_counts[v["type"]] = self.violation_counts.get(v["type"], 0) + 1
+        self.violations.extend(new_violations)
+        if self.max_violations is not None and len(self.violations) > self.max_violations:
+            del self.violations[:len(self.violations) - self.max_violations]
+        return new_violations
+
+    @property
+    def risk_score(self):
+        return calculate_risk_score(self.violation_counts, self.registry)
+
+    def to_analysis(self):
+        if not self.violation_counts:
+            return None
+        return {
+            "violations": list(self.violations), # Return the detailed list
+            "issues": ", ".join(sorted(self.violation_counts)),
+            "risk_score": self.risk_score
+        }
+
+def analyze_person_journey_locally(events, registry=default_registry):
+    # Analyzes a person's event journey locally to detect violations and calculate a risk score.
+    state = JourneyState(registry=registry)
+    for event in events:
+        state.update(event)
+    return state.to_analysis()
+
+# =========================
+# BATCH (VECTORIZED) ENGINE
+# =========================
+
+TIMESTAMP_WIDTH = 32
+
+def events_to_columns(events):
+    # Loads a list of event dicts into NumPy columns once, so every rule can be evaluated as an array operation.
+    person_order, zone_order = {}, {}
+    person_idx = np.fromiter((person_order.setdefault(e["person_id"], len(person_order)) for e in events), dtype=np.int64, count=len(events))
+    zone_idx = np.fromiter((zone_order.setdefault(e["zone"], len(zone_order)) for e in events), dtype=np.int64, count=len(events))
+    event_type = np.array([e["event_type"] for e in events])
+
+    # Hours are read straight out of the fixed-width ISO timestamp bytes ("YYYY-MM-DDTHH...") instead of parsing each string.
+    timestamps = [e["timestamp"] for e in events]
+    ts_bytes = np.array(timestamps, dtype=f"S{TIMESTAMP_WIDTH}").view(np.uint8).reshape(len(events), TIMESTAMP_WIDTH)
+    hour = (ts_bytes[:, 11].astype(np.int64) - 48) * 10 + (ts_bytes[:, 12].astype(np.int64) - 48)
+
     return {
-        "violations": violations, # Return the detailed list
-        "issues": ", ".join(sorted(list(issue_types_found))),
-        "risk_score": int(total_score)
+        "person_ids": list(person_order),
+        "person_idx": person_idx,
+        "event_type": event_type,
+        "authorized": np.fromiter((bool(e.get("authorized", True)) for e in events), dtype=bool, count=len(events)),
+        "duration": np.fromiter((e.get("duration_minutes", 0) for e in events), dtype=np.float64, count=len(events)),
+        # NaN marks events without their own allowed_minutes, so each rule can apply its own threshold.
+        "allowed": np.fromiter((e.get("allowed_minutes", np.nan) for e in events), dtype=np.float64, count=len(events)),
+        "hour": hour,
+        "timestamp": timestamps,
+        "zone": np.array(list(zone_order), dtype=object)[zone_idx],
+        "zone_idx": zone_idx,
     }
+
+def analyze_columns(columns, registry=default_registry):
+    # Evaluates every rule and the risk-score formula across all people in one pass.
+    # Returns {person_id: analysis or None} with the same per-person shape as analyze_person_journey_locally.
+    person_ids = columns["person_ids"]
+    person_idx = columns["person_idx"]
+    num_people = len(person_ids)
+    if num_people == 0:
+        return {}
+
+    # One row per violation: (event position, rule index). Sorting by person, then event position,
+    # then rule reproduces the order the per-event loop would have appended them in.
+    hits_per_rule = registry.evaluate_columns(columns)
+    rule_names = [rule.name for rule in registry.rules]
+    event_pos = np.concatenate(hits_per_rule + [np.empty(0, dtype=np.int64)]).astype(np.int64)
+    type_code = np.concatenate([np.full(len(hits), code, dtype=np.int64) for code, hits in enumerate(hits_per_rule)] + [np.empty(0, dtype=np.int64)])
+    owner = person_idx[event_pos]
+    order = np.lexsort((type_code, event_pos, owner))
+    event_pos, type_code, owner = event_pos[order], type_code[order], owner[order]
+
+    # --- Calculate Risk Score ---
+    num_types = len(rule_names)
+    counts = np.bincount(owner * num_types + type_code, minlength=num_people * num_types).reshape(num_people, num_types)
+    penalties = np.array([registry.penalties[name] for name in rule_names], dtype=np.float64)
+    scores = np.where(counts > 0, penalties * (1 + (counts - 1) * 0.5), 0).sum(axis=1)
+    # Apply cross-category multiplier
+    scores = np.where((counts > 0).sum(axis=1) > 1, scores * 1.2, scores)
+
+    # Assemble the per-person dicts from plain lists; the issue strings only depend on which types are present.
+    results = {person_id: None for person_id in person_ids}
+    type_names = [rule_names[t] for t in type_code.tolist()]
+    zones = columns["zone"][event_pos].tolist()
+    timestamps = [columns["timestamp"][pos] for pos in event_pos.tolist()]
+    present = (counts > 0).tolist()
+    risk_scores = scores.tolist()
+    issues_by_mask = {}
+    boundaries = [0] + (np.flatnonzero(np.diff(owner)) + 1).tolist() + [len(owner)]
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        if start == end:
+            continue
+        person = int(owner[start])
+        mask = tuple(present[person])
+        if mask not in issues_by_mask:
+            issues_by_mask[mask] = ", ".join(sorted(t for t, found in zip(rule_names, mask) if found))
+        results[person_ids[person]] = {
+            "violations": [{"type": t, "zone": z, "timestamp": ts} for t, z, ts in zip(type_names[start:end], zones[start:end], timestamps[start:end])],
+            "issues": issues_by_mask[mask],
+            "risk_score": int(risk_scores[person])
+        }
+    return results
+
+def analyze_events_batch(events, registry=default_registry):
+    # Batch counterpart of analyze_person_journey_locally for a whole day's (or feed's) events, grouped by person_id.
+    if not events:
+        return {}
+    return analyze_columns(events_to_columns(events), registry)
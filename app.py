@@ -1,102 +1,301 @@
 import json
-import zipfile
-import io
-import os
-import datetime
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, StreamingResponse
+import asyncio
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
-from layout import build_warehouse_matrix
-from event_generator import generate_synthetic_dataset, save_dataset, PERSONS
-from ai_openai import process_all_events, get_incident_summary_prompt, get_daily_summary_prompt
-from config import ZONE_ENTRANCE, ZONE_RESTRICTED, ZONE_SAFE, ZONE_CAMERA
-from analyzer import analyze_person_journey_locally
+from layout import get_layout_payload
+from event_generator import generate_synthetic_dataset, PERSONS
+from ai_openai import process_all_events, process_sites, summarize_day
+from jobs import JobManager
+from ingest import IncrementalAnalyzer, aiter_ndjson
+from rules import default_registry
+from run_record import RunRecord
+from dump_writer import DumpWriter
+from artifacts import ArtifactStore
+from event_store import EventStore, DEFAULT_PAGE_SIZE, normalize_timestamp
+from metrics import registry as metrics_registry, timed
+from daily_summary import DailySummarizers
+from sites import site_registry
+from serialization import dumps, parse_fields, project, encode_events_columnar, compress, EVENT_ENCODINGS
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
+job_manager = JobManager()
+artifact_store = ArtifactStore()
+dump_writer = DumpWriter(artifact_store)
+event_store = EventStore()
+daily_summarizers = DailySummarizers()
 
-def _create_debug_dumps(analysis_result):
-    """Helper function to create all data dumps for debugging."""
-    os.makedirs("data/", exist_ok=True)
-    # 1. Create the aggregated AI input data
-    ai_input_prompts = {}
-    events_by_person = {}
-    person_map = {p["id"]: p for p in PERSONS}
-
-    for event in analysis_result["events"]:
-        person_id = event["person_id"]
-        if person_id not in events_by_person: events_by_person[person_id] = []
-        events_by_person[person_id].append(event)
-
-    for person_id, person_events in events_by_person.items():
-        local_analysis = analyze_person_journey_locally(person_events)
-        if local_analysis:
-            person_info = person_map[person_id]
-            ai_input_prompts[f"incident_prompt_{person_info['name']}"] = get_incident_summary_prompt(person_id, person_info["authorized_zones"], local_analysis, person_events)
-    
-    ai_input_prompts["daily_summary_prompt"] = get_daily_summary_prompt(analysis_result["analysis"])
-    
-    with open("data/ai_prompts.json", "w") as f:
-        json.dump(ai_input_prompts, f, indent=2)
-
-    # 2. Create the final AI analysis output dump
-    with open("data/ai_analysis_output.json", "w") as f:
-        json.dump(analysis_result, f, indent=2)
+# How often an SSE stream checks its job for new messages.
+STREAM_POLL_SECONDS = 0.2
+LAYOUT_CACHE_CONTROL = "public, max-age=300"
+# Top-level keys of an analysis result, selectable with ?fields=.
+RESULT_FIELDS = ("analysis", "daily_summary", "events", "usage_stats", "run_id")
+SITES_RESULT_FIELDS = ("sites", "analysis", "usage_stats")
+
+# Render the layout once at startup; it is only rebuilt if the zone config changes.
+get_layout_payload()
 
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
     person_data = {p["name"]: p["authorized_zones"] for p in PERSONS}
-    return templates.TemplateResponse("dashboard.html", {"request": request, "person_data": person_data})
+    person_names = {p["id"]: p["name"] for p in PERSONS}
+    return templates.TemplateResponse("dashboard.html", {"request": request, "person_data": person_data, "person_names": person_names})
+
+def _cached_response(request, representation, media_type, headers=None):
+    # Serves a pre-rendered (body, gzipped body, etag) triple with conditional-GET and gzip support.
+    body, gzipped, etag = representation
+    accepts_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    if accepts_gzip:
+        body, etag = gzipped, etag[:-1] + '-gz"'
+    headers = {"ETag": etag, "Cache-Control": LAYOUT_CACHE_CONTROL, "Vary": "Accept-Encoding", **(headers or {})}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if accepts_gzip:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=media_type, headers=headers)
 
 @app.get("/layout", response_class=HTMLResponse)
-async def get_layout():
-    warehouse, labels = build_warehouse_matrix()
-    grid_html = ""
-    for row in warehouse:
-        for cell in row:
-            css_class = "walkway"
-            if cell == ZONE_RESTRICTED: css_class = "restricted"
-            elif cell == ZONE_SAFE: css_class = "safe"
-            elif cell == ZONE_CAMERA: css_class = "camera"
-            elif cell == ZONE_ENTRANCE: css_class = "entrance"
-            grid_html += f'<div class="grid-item {css_class}"></div>'
-    labels_html = ""
-    for label in labels:
-        y_pos = label["y"] * 20 + 10
-        x_pos = label["x"] * 20 + 10
-        labels_html += f'<div class="grid-label" style="top: {y_pos}px; left: {x_pos}px;">{label["text"]}</div>'
-    return HTMLResponse(content=grid_html + labels_html)
+async def get_layout(request: Request):
+    payload = get_layout_payload()
+    return _cached_response(request, payload.html, "text/html", {"X-Grid-Rows": str(payload.rows), "X-Grid-Cols": str(payload.cols)})
 
-@app.post("/generate_and_analyze")
-async def generate_and_analyze():
-    # Generate fresh event data
+@app.get("/layout.json")
+async def get_layout_json(request: Request):
+    # Grid codes plus legend and labels, for clients that draw the floor plan themselves.
+    return _cached_response(request, get_layout_payload().json, "application/json")
+
+@app.get("/layout.bin")
+async def get_layout_binary(request: Request):
+    # Row-major uint8 zone codes; dimensions are in the X-Grid-Rows / X-Grid-Cols headers.
+    payload = get_layout_payload()
+    return _cached_response(request, payload.binary, "application/octet-stream", {"X-Grid-Rows": str(payload.rows), "X-Grid-Cols": str(payload.cols)})
+
+@app.get("/sites")
+async def get_sites():
+    return [site.to_dict() for site in site_registry]
+
+def _get_site_or_404(site_id):
+    site = site_registry.get(site_id)
+    if site is None:
+        raise HTTPException(status_code=404, detail=f"Site '{site_id}' not found")
+    return site
+
+@app.get("/sites/{site_id}/layout.json")
+async def get_site_layout_json(request: Request, site_id: str):
+    return _cached_response(request, get_layout_payload(_get_site_or_404(site_id).layout).json, "application/json")
+
+@app.post("/sites/analyze")
+async def analyze_sites_events(request: Request, use_cache: bool = True, trace: bool = False, fields: str = None):
+    # Accepts an NDJSON body of events from any number of sites (by their site_id; none means the default site)
+    # and returns per-site results. Large bodies are analyzed across worker processes.
+    names = _parse_response_options(fields, SITES_RESULT_FIELDS)
+    body = await request.body()
+    try:
+        result = await run_in_threadpool(process_sites, body, use_cache=use_cache, trace=trace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _result_response(request, result, names)
+
+def _run_analysis(job=None, use_cache=True, include_events=True, trace=False):
+    # Blocking generate -> analyze -> dump run. Progress is published to `job` when run in the background.
+    # Generate fresh event data; it is handed straight to the pipeline and written out with the other dumps
     events = generate_synthetic_dataset(num_events_per_person=1)
-    save_dataset(events, "data/warehouse_events.json")
-    
+    record = RunRecord(run_id=artifact_store.create_run())
+
+    # Index the events first, so replays can query them while the analysis is still running
+    event_store.add_events(record.run_id, events)
+    if job:
+        job.publish("run", {"run_id": record.run_id, "events": len(events)})
+        if include_events:
+            # Clients that page /runs/{run_id}/events only get the count, not the whole day over SSE.
+            job.publish("events", events)
+
     # Run the full analysis pipeline
-    analysis_result = process_all_events()
-    
-    # Create all necessary data dumps for debugging
-    _create_debug_dumps(analysis_result)
-        
+    on_incident = (lambda incident: job.publish("incident", incident)) if job else None
+    analysis_result = process_all_events(events=events, on_incident=on_incident, use_cache=use_cache, record=record, trace=trace)
+    analysis_result["run_id"] = record.run_id
+
+    # Debug/audit dumps are written from the run record in the background
+    dump_writer.submit(record, analysis_result)
+
+    if not include_events:
+        # Clients that query /runs/{run_id}/events don't need the whole day repeated in the result.
+        return {key: value for key, value in analysis_result.items() if key != "events"}
     return analysis_result
 
-@app.get("/download")
-async def download_files():
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        files_to_zip = {
-            "data/warehouse_events.json": "raw_events.json",
-            "data/ai_prompts.json": "ai_prompts.json",
-            "data/ai_analysis_output.json": "ai_outputs.json"
-        }
-        for file_path, arc_name in files_to_zip.items():
-            if os.path.exists(file_path):
-                zf.write(file_path, arc_name)
-    
-    zip_buffer.seek(0)
+def _get_job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job
+
+async def _job_event_stream(job):
+    # Server-Sent Events: replays everything published so far, then follows the job until it finishes.
+    cursor = 0
+    while True:
+        messages, finished = job.messages_since(cursor)
+        for event, data in messages:
+            with timed("serialize"):
+                payload = dumps(data).decode("utf-8")
+            yield f"event: {event}\ndata: {payload}\n\n"
+        cursor += len(messages)
+        if finished:
+            break
+        await asyncio.sleep(STREAM_POLL_SECONDS)
+
+def _parse_response_options(fields, available, event_encoding="rows"):
+    if event_encoding not in EVENT_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"event_encoding must be one of: {', '.join(EVENT_ENCODINGS)}")
+    try:
+        return parse_fields(fields, available)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _shape_result(result, names, event_encoding):
+    result = project(result, names)
+    if event_encoding == "columnar" and "events" in result:
+        result = {**result, "events": encode_events_columnar(result["events"])}
+    return result
+
+def _encode_result(result, names, event_encoding, accept_encoding):
+    result = _shape_result(result, names, event_encoding)
+    with timed("serialize"):
+        body = dumps(result)
+    with timed("compress"):
+        return compress(body, accept_encoding)
+
+async def _result_response(request, result, names=None, event_encoding="rows"):
+    # JSON response for an analysis result: projected to `names`, events optionally columnar, compressed
+    # (brotli or gzip) when the client accepts it. Encoding runs in the threadpool; a full day is megabytes.
+    body, content_encoding = await run_in_threadpool(_encode_result, result, names, event_encoding, request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/generate_and_analyze")
+async def generate_and_analyze(request: Request, use_cache: bool = True, include_events: bool = True, trace: bool = False,
+                               fields: str = None, event_encoding: str = "rows"):
+    # Synchronous variant kept for API clients; the work runs in the threadpool so the event loop stays free.
+    # trace=true adds per-stage timings to usage_stats.
+    # fields=analysis,usage_stats returns only those top-level keys; event_encoding=columnar sends the events
+    # as dictionary-encoded columns with epoch timestamps (see serialization.encode_events_columnar).
+    names = _parse_response_options(fields, RESULT_FIELDS, event_encoding)
+    include_events = include_events and (names is None or "events" in names)
+    result = await run_in_threadpool(_run_analysis, use_cache=use_cache, include_events=include_events, trace=trace)
+    return await _result_response(request, result, names, event_encoding)
+
+@app.post("/jobs", status_code=202)
+async def create_job(use_cache: bool = True, include_events: bool = True, trace: bool = False):
+    job = job_manager.submit(lambda job: _run_analysis(job, use_cache=use_cache, include_events=include_events, trace=trace))
+    return job.to_status()
+
+@app.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str, fields: str = None, event_encoding: str = "rows"):
+    # fields and event_encoding apply to the result, as for /generate_and_analyze.
+    names = _parse_response_options(fields, RESULT_FIELDS, event_encoding)
+    job = _get_job_or_404(job_id)
+    status = job.to_status()
+    if job.status != "completed":
+        return status
+    status["result"] = await run_in_threadpool(_shape_result, job.result, names, event_encoding)
+    return await _result_response(request, status)
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    job = _get_job_or_404(job_id)
+    return StreamingResponse(_job_event_stream(job), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def _validate_event_query(run_id, start, end):
+    if not await run_in_threadpool(event_store.has_run, run_id):
+        raise HTTPException(status_code=404, detail=f"No stored events for run '{run_id}'")
+    try:
+        normalize_timestamp(start), normalize_timestamp(end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"start/end must be ISO 8601 timestamps: {e}")
+
+@app.get("/runs/{run_id}/events")
+async def get_run_events(run_id: str, start: str = None, end: str = None, zone: str = None, person_id: str = None,
+                         event_type: str = None, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+    # One time-ordered page of a run's events; pass next_cursor back as `cursor` for the following page.
+    await _validate_event_query(run_id, start, end)
+    try:
+        page, next_cursor = await run_in_threadpool(
+            event_store.query, run_id, start=start, end=end, zone=zone, person_id=person_id, event_type=event_type, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor '{cursor}'")
+    # The stored events are already JSON, so the page is assembled without decoding them.
+    body = '{"events":[' + ",".join(page) + '],"next_cursor":' + json.dumps(next_cursor) + "}"
+    return Response(content=body, media_type="application/json")
+
+@app.get("/runs/{run_id}/events.ndjson")
+async def stream_run_events(run_id: str, start: str = None, end: str = None, zone: str = None, person_id: str = None, event_type: str = None):
+    # Every matching event as NDJSON, read from the store a page at a time.
+    await _validate_event_query(run_id, start, end)
+    lines = (line + "\n" for line in event_store.iter_query(run_id, start=start, end=end, zone=zone, person_id=person_id, event_type=event_type))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition of the pipeline's stage timings, AI call, token, cache and rate-limit counters.
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/rules")
+async def get_rules():
+    # The active rule set with per-rule evaluation counters and cumulative time.
+    stats = default_registry.stats()
+    return [{
+        "name": rule.name, "description": rule.description, "penalty": rule.penalty, "dedupe": rule.dedupe,
+        "event_types": sorted(rule.event_types) if rule.event_types else None, **stats[rule.name]
+    } for rule in default_registry.rules]
+
+@app.post("/ingest")
+async def ingest_events(request: Request, summarize: bool = False, day: str = None):
+    # Accepts an NDJSON body of events and/or position samples and analyzes them incrementally as the
+    # upload is read, so memory stays bounded no matter how large the upload is.
+    # summarize=true folds the incidents into that day's running report (see GET /daily_summary).
+    analyzer = IncrementalAnalyzer()
+    try:
+        async for event in aiter_ndjson(request.stream()):
+            analyzer.feed(event)
+        analyzer.flush()
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid event after {analyzer.events_processed} events: {e}")
+    result = analyzer.summary()
+    if summarize:
+        names = {p["id"]: p["name"] for p in PERSONS}
+        incidents = [{"person_id": person_id, "person_name": names.get(person_id, person_id), **analysis} for person_id, analysis in result["analysis"].items()]
+        result["daily_summary"], _ = await run_in_threadpool(summarize_day, incidents, daily_summarizers.get(day))
+    return result
+
+@app.get("/daily_summary")
+async def get_daily_summary(day: str = None):
+    # The day's running report as of the last update; never calls the model.
+    return daily_summarizers.get(day).report()
+
+def _stream_run_zip(run_id):
     return StreamingResponse(
-        zip_buffer,
+        artifact_store.iter_zip(run_id, dump_writer.archive_names()),
         media_type="application/x-zip-compressed",
-        headers={"Content-Disposition": f"attachment; filename=warehouse_analysis_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"}
+        headers={"Content-Disposition": f"attachment; filename=warehouse_analysis_{run_id}.zip"}
     )
+
+@app.get("/download")
+async def download_files():
+    # Artifacts of the most recent completed run.
+    await run_in_threadpool(dump_writer.flush)
+    run_id = artifact_store.latest_run()
+    if not run_id:
+        raise HTTPException(status_code=404, detail="No completed analysis runs yet")
+    return _stream_run_zip(run_id)
+
+@app.get("/download/{run_id}")
+async def download_run(run_id: str):
+    # Make sure this worker's pending dumps have landed before zipping them.
+    await run_in_threadpool(dump_writer.flush)
+    if not artifact_store.is_complete(run_id):
+        raise HTTPException(status_code=404, detail=f"Run '{run_id}' not found or still being written")
+    return _stream_run_zip(run_id)
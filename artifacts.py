@@ -0,0 +1,142 @@
+import datetime
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+
+# =========================
+# RUN-SCOPED ARTIFACT STORE
+# =========================
+# Every analysis run gets its own directory under ARTIFACTS_DIR, so concurrent runs (and several
+# uvicorn workers sharing the volume) never overwrite each other. Files are written atomically, and
+# a run counts as complete once its manifest exists.
+
+ARTIFACTS_DIR = "data/runs"
+RUN_RETENTION_SECONDS = 24 * 3600
+MAX_RUNS = 200
+ZIP_CHUNK_SIZE = 64 * 1024
+MANIFEST = "manifest.json"
+
+RUN_ID_PATTERN = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{8}$")
+
+def new_run_id():
+    # Sortable by creation time, unique across processes.
+    return f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+
+class _ChunkSink:
+    # Write-only file object that hands zip output back to the caller in chunks instead of buffering the archive.
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACTS_DIR, retention_seconds=RUN_RETENTION_SECONDS, max_runs=MAX_RUNS):
+        self.root = root
+        self.retention_seconds = retention_seconds
+        self.max_runs = max_runs
+
+    def run_dir(self, run_id):
+        if not RUN_ID_PATTERN.match(run_id or ""):
+            raise ValueError(f"Invalid run id '{run_id}'")
+        return os.path.join(self.root, run_id)
+
+    def create_run(self):
+        run_id = new_run_id()
+        os.makedirs(self.run_dir(run_id), exist_ok=True)
+        return run_id
+
+    def write(self, run_id, name, data):
+        # Atomic write: readers see either the previous file or the complete new one, never a partial file.
+        directory = self.run_dir(run_id)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(directory, name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def complete(self, run_id, manifest_bytes):
+        # Marks the run as fully written; call after all its artifacts.
+        self.write(run_id, MANIFEST, manifest_bytes)
+
+    def is_complete(self, run_id):
+        try:
+            return os.path.exists(os.path.join(self.run_dir(run_id), MANIFEST))
+        except ValueError:
+            return False
+
+    def artifacts(self, run_id):
+        # Names of the artifact files of a run (temp files and the manifest excluded).
+        directory = self.run_dir(run_id)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if not name.startswith(".") and name != MANIFEST)
+
+    def runs(self):
+        # Run ids, oldest first.
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if RUN_ID_PATTERN.match(name))
+
+    def latest_run(self):
+        for run_id in reversed(self.runs()):
+            if self.is_complete(run_id):
+                return run_id
+        return None
+
+    def iter_zip(self, run_id, arc_names=None):
+        # Streams a ZIP of the run's artifacts chunk by chunk; memory use is bounded by ZIP_CHUNK_SIZE, not archive size.
+        # arc_names optionally renames files inside the archive.
+        arc_names = arc_names or {}
+        sink = _ChunkSink()
+        directory = self.run_dir(run_id)
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name in self.artifacts(run_id):
+                with open(os.path.join(directory, name), "rb") as src, zf.open(arc_names.get(name, name), "w") as dst:
+                    while True:
+                        block = src.read(ZIP_CHUNK_SIZE)
+                        if not block:
+                            break
+                        dst.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+                data = sink.drain()
+                if data:
+                    yield data
+        yield sink.drain()
+
+    def cleanup(self, now=None):
+        # Deletes runs past the retention period and the oldest finished runs beyond max_runs.
+        # Runs without a manifest may still be written to, so only the retention period removes them.
+        # Safe to run from several workers at once: a run already removed by another worker is skipped.
+        now = now or time.time()
+        runs = self.runs()
+        finished = [run_id for run_id in runs if self.is_complete(run_id)]
+        expired = set(finished[:max(0, len(finished) - self.max_runs)])
+        for run_id in runs:
+            try:
+                if now - os.path.getmtime(self.run_dir(run_id)) > self.retention_seconds:
+                    expired.add(run_id)
+            except OSError:
+                continue
+        for run_id in expired:
+            shutil.rmtree(self.run_dir(run_id), ignore_errors=True)
+        return sorted(expired)
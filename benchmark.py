@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+import numpy as np
+
+# =========================
+# BENCHMARK SUITE
+# =========================
+# Measures the analyzer, ingestion, prompt building, zone resolution, the full pipeline and the HTTP endpoints on
+# generated datasets of increasing size. AI calls go to the local stub server (stub_openai.py), so
+# results reflect our own overhead rather than the provider's. Each benchmark reports p50/p99 run
+# latency, items/sec at p50 and peak traced memory; --check fails when a result regresses past the
+# stored baseline. Baselines are machine specific: record them on the machine that runs the check.
+#
+#   python benchmark.py --save-baseline     # record benchmark_baseline.json
+#   python benchmark.py --check             # exit 1 on regression
+
+BASELINE_FILE = "benchmark_baseline.json"
+REGRESSION_TOLERANCE = 0.25
+DEFAULT_SIZES = [100, 1000, 10000]
+DEFAULT_REPEAT = 5
+
+def measure(fn, items, repeat=DEFAULT_REPEAT):
+    # Times `repeat` runs of fn(), then one extra run under tracemalloc for peak memory.
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    p50 = float(np.percentile(durations, 50))
+    return {
+        "items": items, "p50_ms": round(p50 * 1000, 3), "p99_ms": round(float(np.percentile(durations, 99)) * 1000, 3),
+        "items_per_sec": round(items / p50, 1) if p50 else None, "peak_mb": round(peak / 1_000_000, 3)
+    }
+
+def bench_analysis(sizes, repeat):
+    # Local analysis paths over load-generator datasets of increasing size.
+    from analyzer import analyze_person_journey_locally, analyze_events_batch
+    from prompts import get_incident_summary_prompt
+    from ingest import IncrementalAnalyzer
+    from load_generator import iter_load_events, synthetic_person
+    from zones import get_zone_index, ZoneTracker
+
+    results = {}
+    index = get_zone_index()
+    for people in sizes:
+        events = list(iter_load_events(people))
+        by_person = {}
+        for event in events:
+            by_person.setdefault(event["person_id"], []).append(event)
+        analyses = analyze_events_batch(events)
+        flagged = [(pid, analyses[pid]) for pid in by_person if analyses.get(pid)]
+        zones = {f"P{i + 1}": synthetic_person(i)["authorized_zones"] for i in range(people)}
+
+        results[f"analyzer_per_person/people={people}"] = measure(
+            lambda: [analyze_person_journey_locally(person_events) for person_events in by_person.values()], len(events), repeat)
+        results[f"analyzer_batch/people={people}"] = measure(lambda: analyze_events_batch(events), len(events), repeat)
+        results[f"ingest_incremental/people={people}"] = measure(lambda: list(IncrementalAnalyzer().consume(events)), len(events), repeat)
+        results[f"prompt_building/people={people}"] = measure(
+            lambda: [get_incident_summary_prompt(pid, zones[pid], analysis, by_person[pid]) for pid, analysis in flagged], len(flagged), repeat)
+
+        # Raw position samples, 100 per person, as a camera feed would report them.
+        rng = np.random.default_rng(0)
+        samples = people * 100
+        person_ids = rng.integers(0, people, samples).astype(str)
+        timestamps = np.datetime64("2025-11-06T08:00:00") + np.sort(rng.integers(0, 36000, samples)).astype("timedelta64[s]")
+        points = rng.integers(0, [index.rows, index.cols], (samples, 2))
+        results[f"zone_resolve/samples={samples}"] = measure(lambda: index.resolve(points), samples, repeat)
+        results[f"zone_tracking/samples={samples}"] = measure(lambda: ZoneTracker(index=index).update(person_ids, timestamps, points), samples, repeat)
+    return results
+
+def bench_pipeline(base_url, repeat):
+    # process_all_events end to end against the stub, with the summary cache bypassed.
+    import random
+    import ai_openai
+    from event_generator import generate_synthetic_dataset, save_dataset
+
+    random.seed(0)
+    events = generate_synthetic_dataset(num_events_per_person=2)
+    path = os.path.join(tempfile.mkdtemp(), "events.json")
+    save_dataset(events, path)
+    return {"process_all_events": measure(lambda: ai_openai.process_all_events(path, use_cache=False), len(events), repeat)}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def bench_endpoints(repeat):
+    # Real HTTP round trips against the app served by uvicorn on a background thread.
+    import uvicorn
+    from app import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def call(method, path):
+        request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method, data=b"" if method == "POST" else None)
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+    try:
+        return {
+            "GET /layout": measure(lambda: call("GET", "/layout"), 1, max(repeat, 20)),
+            "POST /generate_and_analyze": measure(lambda: call("POST", "/generate_and_analyze?use_cache=false"), 1, repeat),
+        }
+    finally:
+        server.should_exit = True
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    # Lists the benchmarks whose p50 latency grew, or whose throughput dropped, by more than `tolerance`.
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms")
+        elif previous.get("items_per_sec") and current.get("items_per_sec") and current["items_per_sec"] < previous["items_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {previous['items_per_sec']}/s -> {current['items_per_sec']}/s")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline and API.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated people counts for the analysis benchmarks")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--only", choices=["analysis", "pipeline", "endpoints"], action="append", help="run only these groups (repeatable)")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds of latency the stub adds to each AI call")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any benchmark regresses past the baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    groups = args.only or ["analysis", "pipeline", "endpoints"]
+
+    import ai_openai
+    from stub_openai import start_stub_server
+    stub, _, base_url = start_stub_server(latency=args.stub_latency)
+    ai_openai.client = ai_openai.create_client("stub", base_url)
+
+    results = {}
+    try:
+        if "analysis" in groups:
+            results.update(bench_analysis([int(s) for s in args.sizes.split(",")], args.repeat))
+        if "pipeline" in groups:
+            results.update(bench_pipeline(base_url, args.repeat))
+        if "endpoints" in groups:
+            results.update(bench_endpoints(args.repeat))
+    finally:
+        stub.shutdown()
+
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  {'items':>8}  {'p50 ms':>10}  {'p99 ms':>10}  {'items/s':>12}  {'peak MB':>8}")
+    for name, r in results.items():
+        print(f"{name:<{width}}  {r['items']:>8}  {r['p50_ms']:>10}  {r['p99_ms']:>10}  {str(r['items_per_sec']):>12}  {r['peak_mb']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            return 1
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Performance regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
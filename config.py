@@ -1,3 +1,5 @@
+import os
+
 # =========================
 # CONFIG & RULES
 # =========================
@@ -35,18 +37,39 @@ CAMERAS = [
 ]
 
 # Rules for AI analysis
+# Each rule is compiled once at startup by rules.py:
+#   check       - predicate kind (see rules.CHECKS): unauthorized, overstay, outside_hours, zone_in
+#   event_types - only evaluate the rule for these event types (omit to evaluate on every event)
+#   dedupe      - "none" (default), "once_per_journey" or "once_per_zone"
+#   penalty     - base risk score contribution
+# Rules are evaluated, and their violations reported, in declaration order.
 RULES = {
+    "unauthorized_access": {
+        "description": "Person enters a zone they are not authorized for",
+        "check": "unauthorized",
+        "event_types": ["person_entered"],
+        "penalty": 50
+    },
     "loitering": {
         "description": "Person stays in restricted area too long",
+        "check": "overstay",
+        "event_types": ["person_exited"],
         "threshold_minutes": 5,
         "penalty": 25
     },
-    "unauthorized_access": {
-        "description": "Person enters a zone they are not authorized for",
-        "penalty": 50
-    },
     "after_hours_access": {
         "description": "Access outside of normal operating hours (8am-6pm)",
+        "check": "outside_hours",
+        "opening_hour": 8,
+        "closing_hour": 18,
+        # To avoid spam, we only add one after-hours violation per journey
+        "dedupe": "once_per_journey",
         "penalty": 15
     }
 }
+
+# Optional JSON file of extra/overriding rules in the same format as RULES.
+RULES_FILE = os.environ.get("WAREHOUSE_RULES_FILE")
+
+# Optional JSON file of sites, each with its own layout, personnel and rules (see sites.py).
+SITES_FILE = os.environ.get("WAREHOUSE_SITES_FILE")
@@ -0,0 +1,163 @@
+import datetime
+import json
+import threading
+from collections import Counter
+
+# =========================
+# INCREMENTAL DAILY SUMMARY
+# =========================
+# The day's offenders, hot-spot zones and violation counts are aggregated locally as incidents come
+# in. The model is only asked to update the actionable items, and it only sees the compact aggregates,
+# its previous items and the incidents that changed since its last update. That keeps the daily-summary
+# prompt roughly the same size all day, however many incidents have piled up.
+
+DAILY_PROMPT_MAX_CHARS = 12_000  # ~3k tokens
+PROMPT_TOP_OFFENDERS = 10
+PROMPT_TOP_ZONES = 5
+MAX_ACTIONABLE_ITEMS = 8
+MAX_ITEM_DETAILS_CHARS = 200
+MAX_SUMMARIZER_DAYS = 7
+
+class DailyAggregates:
+    # Running per-day totals. Each violation is identified by its type, zone and timestamp, so adding the same
+    # incidents again is a no-op, while repeat violations from later uploads still count.
+    def __init__(self):
+        self.people = {}  # person_id -> {"person_name", "risk_score", "violations": {(type, zone, timestamp): None}} (insertion ordered)
+        self.zone_counts = Counter()
+        self.type_counts = Counter()
+
+    def add(self, incidents):
+        # Returns the delta: one entry per person whose violations grew, listing only the new ones.
+        delta = []
+        for incident in incidents:
+            person = self.people.setdefault(incident["person_id"], {"person_name": incident.get("person_name"), "risk_score": 0, "violations": {}})
+            person["risk_score"] = max(person["risk_score"], incident["risk_score"])
+            known = person["violations"]
+            new = Counter()
+            for v in incident["violations"]:
+                key = (v["type"], v["zone"], v["timestamp"])
+                if key not in known:
+                    known[key] = None
+                    new[v["type"], v["zone"]] += 1
+            if not new:
+                continue
+            for (violation_type, zone), count in new.items():
+                self.zone_counts[zone] += count
+                self.type_counts[violation_type] += count
+            delta.append({
+                "person_id": incident["person_id"], "risk_score": person["risk_score"],
+                "new_violations": [{"type": t, "zone": z, "count": c} for (t, z), c in new.items()]
+            })
+        return delta
+
+    def offenders(self):
+        ranked = sorted(self.people.items(), key=lambda item: -item[1]["risk_score"])
+        return [{
+            "person_id": person_id, "person_name": person["person_name"], "risk_score": person["risk_score"],
+            "violations": list(dict.fromkeys(t for t, _, _ in person["violations"]))
+        } for person_id, person in ranked]
+
+    def to_summary(self):
+        # The "summary" object of the daily report, computed without the model.
+        return {
+            "offenders": [{"person_id": o["person_id"], "violations": o["violations"]} for o in self.offenders()],
+            "hot_spot_zones": [zone for zone, _ in self.zone_counts.most_common(3)],
+            "common_violations": [violation for violation, _ in self.type_counts.most_common()],
+            "zone_counts": dict(self.zone_counts.most_common()),
+            "violation_counts": dict(self.type_counts.most_common())
+        }
+
+    def local_actionable_items(self):
+        # Templated items for when the model is unavailable.
+        items = [
+            {"action": f"Review access to the {zone}", "details": f"{count} violation(s) recorded in the {zone} today."}
+            for zone, count in self.zone_counts.most_common(3)
+        ]
+        offenders = self.offenders()
+        if offenders:
+            top = offenders[0]
+            items.append({"action": f"Follow up with {top['person_name'] or top['person_id']}", "details": f"Highest risk score today ({top['risk_score']})."})
+        return items
+
+def get_incremental_daily_prompt(aggregates, delta, previous_items, max_chars=DAILY_PROMPT_MAX_CHARS):
+    # Compact totals + previous items + the delta, highest-risk first, trimmed to fit max_chars.
+    offenders = [{k: o[k] for k in ("person_id", "risk_score", "violations")} for o in aggregates.offenders()[:PROMPT_TOP_OFFENDERS]]
+    previous = [{"action": item.get("action"), "details": str(item.get("details", ""))[:MAX_ITEM_DETAILS_CHARS]} for item in previous_items or []]
+    header = f"""You are a security shift supervisor keeping today's security report up to date. The day's totals below were computed locally and are authoritative; do not recount them.
+
+Day so far: {len(aggregates.people)} people flagged, {sum(aggregates.type_counts.values())} violations.
+Top offenders: {json.dumps(offenders, separators=(",", ":"))}
+Violations per zone: {json.dumps(dict(aggregates.zone_counts.most_common(PROMPT_TOP_ZONES)), separators=(",", ":"))}
+Violations per type: {json.dumps(dict(aggregates.type_counts.most_common()), separators=(",", ":"))}
+
+Your previous actionable items:
+{json.dumps(previous, separators=(",", ":")) if previous else "None yet."}
+"""
+    footer = f"""
+Respond with a single JSON object with one key, "actionable_items": the updated list (at most {MAX_ACTIONABLE_ITEMS}) of objects with well argumented actionable recommendations, each with an "action" and other relevant details. Keep previous items that still apply and add or revise items for the new incidents."""
+
+    budget = max_chars - len(header) - len(footer) - 200
+    lines, omitted = [], 0
+    for entry in sorted(delta, key=lambda e: -e["risk_score"]):
+        line = json.dumps(entry, separators=(",", ":"))
+        if len(line) + 1 > budget:
+            omitted += 1
+            continue
+        lines.append(line)
+        budget -= len(line) + 1
+    new_text = "\n".join(lines)
+    if omitted:
+        new_text += f"\n...and {omitted} more people with new violations, already included in the totals above."
+    return f"{header}\nNew since your previous report ({len(delta)} people):\n{new_text}\n{footer}"
+
+class DailySummarizer:
+    # Incremental daily report for one day. Callers hold `lock` across prepare -> model call -> apply.
+    def __init__(self, max_chars=DAILY_PROMPT_MAX_CHARS):
+        self.max_chars = max_chars
+        self.aggregates = DailyAggregates()
+        self.previous_items = None
+        self.previous_source = None
+        self.updates = 0
+        self.lock = threading.Lock()
+
+    def prepare(self, incidents):
+        # Folds the incidents into the aggregates; returns the prompt for the delta, or None when nothing changed.
+        delta = self.aggregates.add(incidents)
+        if not delta:
+            return None
+        return get_incremental_daily_prompt(self.aggregates, delta, self.previous_items, self.max_chars)
+
+    def apply(self, ai_response):
+        # Records the model's updated items (if usable) and returns the current report.
+        items = ai_response.get("actionable_items") if isinstance(ai_response, dict) else None
+        if isinstance(items, list):
+            self.previous_items, self.previous_source = items[:MAX_ACTIONABLE_ITEMS], "ai"
+            self.updates += 1
+        elif self.previous_source != "ai":
+            self.previous_items, self.previous_source = self.aggregates.local_actionable_items(), "local"
+        return self.report()
+
+    def report(self):
+        if not self.aggregates.people:
+            return {"summary": "No incidents to summarize.", "actionable_items": []}
+        return {
+            "summary": self.aggregates.to_summary(),
+            "actionable_items": self.previous_items or self.aggregates.local_actionable_items(),
+            "summary_source": self.previous_source or "local"
+        }
+
+class DailySummarizers:
+    # One summarizer per day, keeping only the most recent days.
+    def __init__(self, max_days=MAX_SUMMARIZER_DAYS):
+        self.max_days = max_days
+        self._summarizers = {}
+        self._lock = threading.Lock()
+
+    def get(self, day=None):
+        day = day or datetime.date.today().isoformat()
+        with self._lock:
+            if day not in self._summarizers:
+                self._summarizers[day] = DailySummarizer()
+                for stale in sorted(self._summarizers)[:-self.max_days]:
+                    del self._summarizers[stale]
+            return self._summarizers[day]
@@ -0,0 +1,76 @@
+import datetime
+import gzip
+import logging
+import queue
+import threading
+from artifacts import ArtifactStore
+from metrics import timed
+from serialization import dumps
+
+# Gzip the dump files (written as <name>.gz).
+DUMP_COMPRESS = False
+
+# Dump file name -> name inside the /download archive.
+DUMP_FILES = {
+    "warehouse_events.json": "raw_events.json",
+    "ai_prompts.json": "ai_prompts.json",
+    "ai_analysis_output.json": "ai_outputs.json",
+    "ai_exchanges.ndjson": "ai_exchanges.ndjson",
+}
+
+logger = logging.getLogger(__name__)
+
+class DumpWriter:
+    # Writes debug/audit dumps into the run's artifact directory on a background thread,
+    # so the request path only pays for a queue put.
+    def __init__(self, store=None, compress=DUMP_COMPRESS):
+        self.store = store or ArtifactStore()
+        self.compress = compress
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, record, result):
+        # Queues a finished run (its RunRecord and the API result) for writing.
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="dump-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((record, result))
+
+    def flush(self):
+        # Blocks until every queued dump has been written.
+        self._queue.join()
+
+    def archive_names(self):
+        # Stored file name -> name inside the /download archive.
+        suffix = ".gz" if self.compress else ""
+        return {name + suffix: arc_name + suffix for name, arc_name in DUMP_FILES.items()}
+
+    def write(self, record, result):
+        # Writes every dump of the run, then its manifest (which marks the run complete), then prunes old runs.
+        files = [
+            self._write_file(record.run_id, "warehouse_events.json", dumps(record.events)),
+            self._write_file(record.run_id, "ai_prompts.json", dumps(record.prompts)),
+            self._write_file(record.run_id, "ai_analysis_output.json", dumps(result)),
+            self._write_file(record.run_id, "ai_exchanges.ndjson", b"".join(dumps(exchange) + b"\n" for exchange in record.exchanges)),
+        ]
+        self.store.complete(record.run_id, dumps({"run_id": record.run_id, "written_at": datetime.datetime.now().isoformat(), "files": files}))
+        self.store.cleanup()
+
+    def _write_file(self, run_id, name, data):
+        if self.compress:
+            name, data = name + ".gz", gzip.compress(data, compresslevel=5)
+        self.store.write(run_id, name, data)
+        return name
+
+    def _run(self):
+        while True:
+            record, result = self._queue.get()
+            try:
+                with timed("dump_write"):
+                    self.write(record, result)
+            except Exception as e:
+                logger.exception("Writing debug dumps failed. Error: %s", e)
+            finally:
+                self._queue.task_done()
@@ -12,30 +12,33 @@ PERSONS = [
 ]
 
 ZONE_COORDS = {area["name"]: area for area in RESTRICTED_AREAS}
+# Center cell of every zone, computed once rather than on each event.
+ZONE_CENTERS = {
+    name: (int((area['top_left'][0] + area['bottom_right'][0]) / 2), int((area['top_left'][1] + area['bottom_right'][1]) / 2))
+    for name, area in ZONE_COORDS.items()
+}
 
 def get_zone_center(zone_name):
-    # Calculates the center pixel coordinate for a given zone name.
-    area = ZONE_COORDS.get(zone_name)
-    if not area: return None
-    r1, c1 = area['top_left']
-    r2, c2 = area['bottom_right']
-    return (int((r1 + r2) / 2), int((c1 + c2) / 2))
+    # Center cell coordinate for a given zone name.
+    return ZONE_CENTERS.get(zone_name)
 
-def random_time(start_time):
+def random_time(start_time, rng=random):
     # Generate a random datetime shortly after a given start time.
-    return start_time + datetime.timedelta(minutes=random.randint(1, 5), seconds=random.randint(0, 59))
+    return start_time + datetime.timedelta(minutes=rng.randint(1, 5), seconds=rng.randint(0, 59))
 
-def generate_person_journey(person, num_zones_to_visit=2, force_after_hours=False):
+def generate_person_journey(person, num_zones_to_visit=2, force_after_hours=False, rng=random, day=datetime.date(2025, 11, 6),
+                            zones_to_visit=None, duration_range=(4, 10)):
     # Generates a full journey for a single person, from entering to exiting the warehouse.
+    # rng, day, zones_to_visit and duration_range let the load generator drive seeded, multi-day, rate-controlled journeys.
     journey = []
     
     # Generate a time for the journey, with a chance for it to be after hours
     if force_after_hours:
-        hour = random.randint(18, 20) # Force after-hours event
+        hour = rng.randint(18, 20) # Force after-hours event
     else:
-        hour = random.randint(8, 17) # Normal operating hours
+        hour = rng.randint(8, 17) # Normal operating hours
         
-    base_time = datetime.datetime(2025, 11, 6, hour, random.randint(0, 59))
+    base_time = datetime.datetime(day.year, day.month, day.day, hour, rng.randint(0, 59))
     current_time = base_time
 
     coords = get_zone_center("Entrance")
@@ -44,30 +47,31 @@ def generate_person_journey(person, num_zones_to_visit=2, force_after_hours=Fals
         "zone": "Entrance", "event_type": "enter_warehouse", "authorized": True, "coords": coords
     })
 
-    available_zones = [name for name in ZONE_COORDS if name != 'Entrance']
-    num_to_visit = min(num_zones_to_visit, len(available_zones))
-    zones_to_visit = random.sample(available_zones, k=num_to_visit)
+    if zones_to_visit is None:
+        available_zones = [name for name in ZONE_COORDS if name != 'Entrance']
+        num_to_visit = min(num_zones_to_visit, len(available_zones))
+        zones_to_visit = rng.sample(available_zones, k=num_to_visit)
     
     for zone in zones_to_visit:
-        entry_time = random_time(current_time)
+        entry_time = random_time(current_time, rng)
         authorized = zone in person["authorized_zones"]
         coords = get_zone_center(zone)
         
         journey.append({
             "timestamp": entry_time.isoformat(), "person_id": person["id"], "person_name": person["name"],
-            "zone": zone, "event_type": "person_entered", "authorized": authorized, "camera_id": f"C{random.randint(1,4)}", "coords": coords
+            "zone": zone, "event_type": "person_entered", "authorized": authorized, "camera_id": f"C{rng.randint(1,4)}", "coords": coords
         })
 
-        duration_minutes = random.randint(4, 10)
+        duration_minutes = rng.randint(*duration_range)
         exit_time = entry_time + datetime.timedelta(minutes=duration_minutes)
         journey.append({
             "timestamp": exit_time.isoformat(), "person_id": person["id"], "person_name": person["name"],
-            "zone": zone, "event_type": "person_exited", "authorized": authorized, "camera_id": f"C{random.randint(1,4)}",
+            "zone": zone, "event_type": "person_exited", "authorized": authorized, "camera_id": f"C{rng.randint(1,4)}",
             "coords": coords, "duration_minutes": duration_minutes, "allowed_minutes": RULES['loitering']['threshold_minutes']
         })
         current_time = exit_time
 
-    current_time = random_time(current_time)
+    current_time = random_time(current_time, rng)
     coords = get_zone_center("Entrance")
     journey.append({
         "timestamp": current_time.isoformat(), "person_id": person["id"], "person_name": person["name"],
@@ -88,7 +92,11 @@ def generate_synthetic_dataset(num_events_per_person=2):
     return dataset
 
 def save_dataset(dataset, filename="data/warehouse_events.json"):
-    # Saves the dataset to a JSON file.
+    # Saves the dataset to a JSON file, or one event per line when the filename ends in .ndjson / .jsonl.
     os.makedirs(os.path.dirname(filename), exist_ok=True)
     with open(filename, "w") as f:
-        json.dump(dataset, f, indent=2)
+        if filename.endswith((".ndjson", ".jsonl")):
+            for event in dataset:
+                f.write(json.dumps(event) + "\n")
+        else:
+            json.dump(dataset, f, indent=2)
@@ -0,0 +1,113 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# =========================
+# TIME-INDEXED EVENT STORE
+# =========================
+# Events of each analysis run, indexed by time, person and zone, so the API can answer windowed
+# queries ("Server Room between 18:00 and 19:00") without shipping the whole day to the client.
+# Events are kept as their original JSON text and returned without being re-encoded.
+
+EVENT_STORE_PATH = "data/events.sqlite3"
+EVENT_STORE_MAX_RUNS = 50
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+def normalize_timestamp(value):
+    # Accepts any ISO 8601 date/time and returns it in the stored isoformat, which sorts chronologically as text.
+    if value is None:
+        return None
+    return datetime.datetime.fromisoformat(value).isoformat()
+
+def encode_cursor(timestamp, seq):
+    return f"{timestamp}|{seq}"
+
+def decode_cursor(cursor):
+    timestamp, seq = cursor.rsplit("|", 1)
+    return timestamp, int(seq)
+
+class EventStore:
+    def __init__(self, path=EVENT_STORE_PATH, max_runs=EVENT_STORE_MAX_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, created_at REAL NOT NULL, events INTEGER NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "run_id TEXT NOT NULL, seq INTEGER NOT NULL, timestamp TEXT NOT NULL, person_id TEXT NOT NULL, "
+                "zone TEXT, event_type TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (run_id, seq))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_events_time ON events(run_id, timestamp, seq)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_events_person ON events(run_id, person_id, timestamp, seq)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_events_zone ON events(run_id, zone, timestamp, seq)")
+        return self._conn
+
+    def add_events(self, run_id, events):
+        # Stores a run's events in one transaction, then drops the oldest runs beyond max_runs.
+        rows = (
+            (run_id, seq, normalize_timestamp(e["timestamp"]), e["person_id"], e.get("zone"), e["event_type"], json.dumps(e))
+            for seq, e in enumerate(events)
+        )
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                count = conn.execute("SELECT COUNT(*) FROM events WHERE run_id = ?", (run_id,)).fetchone()[0]
+                conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?)", (run_id, time.time(), count))
+                self._prune(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def has_run(self, run_id):
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is not None
+
+    def query(self, run_id, start=None, end=None, zone=None, person_id=None, event_type=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        # One page of a run's events in time order: start is inclusive, end exclusive.
+        # Returns (JSON texts of the events, cursor for the next page or None when exhausted).
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        clauses, params = ["run_id = ?"], [run_id]
+        for column, op, value in (("timestamp", ">=", normalize_timestamp(start)), ("timestamp", "<", normalize_timestamp(end)),
+                                  ("zone", "=", zone), ("person_id", "=", person_id), ("event_type", "=", event_type)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if cursor:
+            clauses.append("(timestamp, seq) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+        sql = f"SELECT timestamp, seq, data FROM events WHERE {' AND '.join(clauses)} ORDER BY timestamp, seq LIMIT ?"
+        with self._lock:
+            rows = self._connect().execute(sql, (*params, limit + 1)).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][0], rows[limit - 1][1]) if len(rows) > limit else None
+        return [row[2] for row in rows[:limit]], next_cursor
+
+    def iter_query(self, run_id, page_size=DEFAULT_PAGE_SIZE, **filters):
+        # Every matching event's JSON text, fetched page by page so the lock is never held across a yield.
+        cursor = None
+        while True:
+            page, cursor = self.query(run_id, limit=page_size, cursor=cursor, **filters)
+            yield from page
+            if not cursor:
+                break
+
+    def _prune(self, conn):
+        stale = [row[0] for row in conn.execute("SELECT run_id FROM runs ORDER BY created_at DESC LIMIT -1 OFFSET ?", (self.max_runs,))]
+        for run_id in stale:
+            conn.execute("DELETE FROM events WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
@@ -0,0 +1,123 @@
+import json
+import sys
+from analyzer import JourneyState
+from event_generator import PERSONS
+from zones import ZoneTracker
+
+# Per-person memory bounds for long-running feeds.
+MAX_VIOLATIONS_PER_PERSON = 100
+# Position samples resolved to zones in one vectorized ZoneTracker update.
+POSITION_BATCH_SIZE = 1024
+
+def iter_ndjson(lines):
+    # Yields one event per non-blank NDJSON line (str or bytes).
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+async def aiter_ndjson(chunks):
+    # Async counterpart of iter_ndjson over a byte-chunk stream (e.g. an HTTP request body); lines may span chunks.
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+def iter_events_file(path):
+    # Streams events from an NDJSON file; legacy JSON-array files (.json) are still loaded whole.
+    if path.endswith(".json"):
+        with open(path) as f:
+            yield from json.load(f)
+        return
+    with open(path) as f:
+        yield from iter_ndjson(f)
+
+class IncrementalAnalyzer:
+    # Maintains per-person journey state as events arrive, so violations and risk scores are always current.
+    # Memory is bounded by the number of people, independent of how many events are fed through.
+    # Besides zone-labelled events, the feed may carry raw position samples ({"person_id", "timestamp",
+    # "position": [row, col]}); they are buffered and turned into entered/exited events by a ZoneTracker.
+    def __init__(self, max_violations=MAX_VIOLATIONS_PER_PERSON, tracker=None, position_batch_size=POSITION_BATCH_SIZE):
+        self.max_violations = max_violations
+        self.states = {}
+        self.events_processed = 0
+        self.positions_processed = 0
+        self.tracker = tracker
+        self.position_batch_size = position_batch_size
+        self._positions = []
+
+    def process(self, event):
+        # Applies one event; returns an update dict when it triggered new violations, otherwise None.
+        person_id = event["person_id"]
+        state = self.states.get(person_id)
+        if state is None:
+            state = self.states[person_id] = JourneyState(max_violations=self.max_violations)
+        self.events_processed += 1
+
+        new_violations = state.update(event)
+        if not new_violations:
+            return None
+        return {
+            "person_id": person_id, "timestamp": event["timestamp"], "new_violations": new_violations,
+            "issues": ", ".join(sorted(state.violation_counts)), "risk_score": state.risk_score
+        }
+
+    def feed(self, event):
+        # Applies one event or position sample; returns the updates it triggered (possibly none yet, as
+        # samples are resolved a batch at a time). Pending samples go first, so the feed order is kept.
+        if "position" in event:
+            self._positions.append((event["person_id"], event["timestamp"], event["position"]))
+            if len(self._positions) >= self.position_batch_size:
+                return self.flush()
+            return []
+        updates = self.flush()
+        update = self.process(event)
+        if update:
+            updates.append(update)
+        return updates
+
+    def flush(self):
+        # Resolves the buffered position samples and analyzes the events they complete.
+        if not self._positions:
+            return []
+        if self.tracker is None:
+            self.tracker = ZoneTracker(persons=PERSONS)
+        person_ids, timestamps, points = zip(*self._positions)
+        self._positions = []
+        self.positions_processed += len(person_ids)
+        updates = (self.process(event) for event in self.tracker.update(person_ids, timestamps, points))
+        return [update for update in updates if update]
+
+    def consume(self, events):
+        # Feeds an event iterable through the analyzer, yielding each update as it happens.
+        for event in events:
+            yield from self.feed(event)
+        yield from self.flush()
+
+    def results(self):
+        # {person_id: analysis} for everyone with at least one violation, in the same shape as analyze_person_journey_locally.
+        return {person_id: state.to_analysis() for person_id, state in self.states.items() if state.violation_counts}
+
+    def summary(self):
+        return {
+            "events_processed": self.events_processed, "positions_processed": self.positions_processed,
+            "people_seen": len(self.states), "analysis": self.results()
+        }
+
+def main(argv):
+    # Usage: python ingest.py [events.ndjson | -]
+    # Prints one NDJSON update per violation as the feed is read, then a final summary line.
+    source = argv[1] if len(argv) > 1 else "-"
+    analyzer = IncrementalAnalyzer()
+    events = iter_ndjson(sys.stdin) if source == "-" else iter_events_file(source)
+    for update in analyzer.consume(events):
+        print(json.dumps({"type": "update", **update}), flush=True)
+    print(json.dumps({"type": "summary", **analyzer.summary()}))
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,94 @@
+import datetime
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Analysis runs executing at once, and finished jobs kept around for status polling.
+MAX_CONCURRENT_JOBS = 2
+MAX_FINISHED_JOBS = 50
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    # A single background analysis run. Progress is published as an append-only list of
+    # (event, data) messages so any number of stream readers can follow along with their own cursor.
+    # Once the job finishes, the progress messages are dropped and only the final result/failure message is
+    # kept: the result already carries everything they did, and finished jobs are retained for a while.
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.created_at = datetime.datetime.now().isoformat()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._messages = []
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def publish(self, event, data):
+        with self._lock:
+            self._messages.append((event, data))
+
+    def messages_since(self, cursor):
+        # Returns the messages after `cursor` and whether the job has finished; read together so no message is missed.
+        with self._lock:
+            return self._messages[max(0, cursor - self._dropped):], self.done
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.result, self.error = result, error
+            self.finished_at = datetime.datetime.now().isoformat()
+            self._dropped = len(self._messages)
+            if status == "completed":
+                self._messages = [("result", result)]
+            else:
+                self._messages = [("failed", {"error": error})]
+            self.status = status
+
+    def to_status(self):
+        with self._lock:
+            return {
+                "job_id": self.id, "status": self.status, "created_at": self.created_at,
+                "finished_at": self.finished_at, "messages": self._dropped + len(self._messages), "error": self.error
+            }
+
+class JobManager:
+    # Runs analysis jobs on a small thread pool, off the event loop.
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, max_finished=MAX_FINISHED_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._jobs = {}
+        self._max_finished = max_finished
+        self._lock = threading.Lock()
+
+    def submit(self, fn):
+        # Schedules fn(job); its return value becomes the job result.
+        job = Job()
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn):
+        job.status = "running"
+        job.publish("status", {"status": "running"})
+        try:
+            job._finish("completed", result=fn(job))
+        except Exception as e:
+            logger.exception("Job %s failed. Error: %s", job.id, e)
+            job._finish("failed", error=str(e))
+
+    def _prune(self):
+        # Drops the oldest finished jobs beyond the retention limit (dicts keep insertion order).
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self._max_finished)]:
+            del self._jobs[job_id]
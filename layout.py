@@ -1,13 +1,27 @@
+import functools
+import gzip
+import hashlib
+import json
 import numpy as np
-from config import WAREHOUSE_ROWS, WAREHOUSE_COLS, ZONE_WALKWAY, ZONE_RESTRICTED, ZONE_SAFE, ZONE_CAMERA, ZONE_ENTRANCE, RESTRICTED_AREAS, SAFE_AREAS, CAMERAS
+import config
+from config import ZONE_WALKWAY, ZONE_RESTRICTED, ZONE_SAFE, ZONE_CAMERA, ZONE_ENTRANCE
 
-def build_warehouse_matrix():
+def default_layout():
+    # The layout defined in config, read at call time so runtime edits are picked up on re-render.
+    return {
+        "rows": config.WAREHOUSE_ROWS, "cols": config.WAREHOUSE_COLS, "restricted_areas": config.RESTRICTED_AREAS,
+        "safe_areas": config.SAFE_AREAS, "cameras": config.CAMERAS
+    }
+
+def build_warehouse_matrix(layout=None):
     # Builds the warehouse grid and returns it along with text labels for UI rendering.
-    warehouse = np.full((WAREHOUSE_ROWS, WAREHOUSE_COLS), ZONE_WALKWAY)
+    # `layout` is a dict shaped like default_layout(); sites pass their own.
+    layout = layout or default_layout()
+    warehouse = np.full((layout["rows"], layout["cols"]), ZONE_WALKWAY)
     labels = []
 
     # Mark restricted zones and add labels
-    for area in RESTRICTED_AREAS:
+    for area in layout["restricted_areas"]:
         r1, c1 = area['top_left']
         r2, c2 = area['bottom_right']
         zone_type = ZONE_ENTRANCE if area['name'] == 'Entrance' else ZONE_RESTRICTED
@@ -15,15 +29,59 @@ def build_warehouse_matrix():
         labels.append({"text": area['name'], "y": (r1 + r2 + 1) / 2, "x": (c1 + c2 + 1) / 2})
 
     # Mark safe areas
-    for area in SAFE_AREAS:
+    for area in layout["safe_areas"]:
         r1, c1 = area['top_left']
         r2, c2 = area['bottom_right']
         warehouse[r1:r2+1, c1:c2+1] = ZONE_SAFE
 
     # Mark cameras and add labels
-    for cam in CAMERAS:
+    for cam in layout["cameras"]:
         r, c = cam['pos']
         warehouse[r, c] = ZONE_CAMERA
         labels.append({"text": str(cam['id']), "y": r, "x": c})
 
     return warehouse, labels
+
+# =========================
+# PRE-RENDERED LAYOUT
+# =========================
+
+CELL_SIZE_PX = 20
+CELL_CSS_CLASSES = {ZONE_WALKWAY: "walkway", ZONE_RESTRICTED: "restricted", ZONE_SAFE: "safe", ZONE_CAMERA: "camera", ZONE_ENTRANCE: "entrance"}
+
+class LayoutPayload:
+    # Immutable, ready-to-serve renderings of the layout: HTML fragment, JSON and raw uint8 grid, each with a gzipped copy and an ETag.
+    def __init__(self, warehouse, labels):
+        self.rows, self.cols = warehouse.shape
+        self.html = _encode(render_layout_html(warehouse, labels).encode("utf-8"))
+        self.json = _encode(json.dumps({
+            "rows": self.rows, "cols": self.cols, "cell_size": CELL_SIZE_PX,
+            "legend": {str(code): css_class for code, css_class in CELL_CSS_CLASSES.items()},
+            "grid": warehouse.tolist(), "labels": labels
+        }, separators=(",", ":")).encode("utf-8"))
+        self.binary = _encode(warehouse.astype(np.uint8).tobytes())
+
+def _encode(body):
+    # (body, gzipped body, etag) for one representation.
+    return body, gzip.compress(body, compresslevel=9, mtime=0), '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def render_layout_html(warehouse, labels):
+    # Renders the grid cells and labels as one HTML fragment, built with a single join rather than repeated concatenation.
+    cells = {code: f'<div class="grid-item {css_class}"></div>' for code, css_class in CELL_CSS_CLASSES.items()}
+    grid_html = "".join([cells.get(code, cells[ZONE_WALKWAY]) for code in warehouse.ravel().tolist()])
+    labels_html = "".join([
+        f'<div class="grid-label" style="top: {label["y"] * CELL_SIZE_PX + CELL_SIZE_PX // 2}px; left: {label["x"] * CELL_SIZE_PX + CELL_SIZE_PX // 2}px;">{label["text"]}</div>'
+        for label in labels
+    ])
+    return grid_html + labels_html
+
+def _config_signature(layout=None):
+    # Everything the layout depends on, as canonical JSON; a change here (e.g. zones edited at runtime) triggers a re-render.
+    return json.dumps(layout or default_layout(), sort_keys=True)
+
+@functools.lru_cache(maxsize=16)
+def _build_payload(signature):
+    return LayoutPayload(*build_warehouse_matrix(json.loads(signature)))
+
+def get_layout_payload(layout=None):
+    return _build_payload(_config_signature(layout))
@@ -0,0 +1,125 @@
+import argparse
+import datetime
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import sys
+from config import RULES
+from event_generator import ZONE_COORDS, generate_person_journey
+
+# =========================
+# LOAD GENERATION
+# =========================
+# Synthesizes large NDJSON event datasets for benchmarking the analyzer and ingestion paths.
+# Output is written chunk by chunk (one chunk = one day for a slice of people), so memory stays
+# bounded by the chunk size however many events are produced. Events are time-ordered within a
+# chunk and chunks are written day by day.
+
+VISITABLE_ZONES = [name for name in ZONE_COORDS if name != "Entrance"]
+PEOPLE_PER_CHUNK = 1000
+
+def synthetic_person(index, seed=0):
+    # Deterministic person record: the same (index, seed) always gives the same authorizations.
+    rng = random.Random(f"{seed}:person:{index}")
+    return {
+        "id": f"P{index + 1}", "name": f"Person {index + 1}",
+        "authorized_zones": rng.sample(VISITABLE_ZONES, k=rng.randint(0, len(VISITABLE_ZONES)))
+    }
+
+def generate_person_day(person, day, rng, zones_per_journey=2, journeys_per_day=1, violation_rate=0.2, after_hours_rate=0.05):
+    # All journeys for one person on one day. violation_rate controls how often a visit goes to an
+    # unauthorized zone and how often a journey overstays the loitering threshold.
+    threshold = RULES["loitering"]["threshold_minutes"]
+    authorized = [z for z in VISITABLE_ZONES if z in person["authorized_zones"]]
+    unauthorized = [z for z in VISITABLE_ZONES if z not in person["authorized_zones"]]
+    events = []
+    for _ in range(journeys_per_day):
+        zones = []
+        for _ in range(zones_per_journey):
+            pool = unauthorized if (rng.random() < violation_rate or not authorized) and unauthorized else authorized
+            zones.append(rng.choice(pool))
+        duration_range = (threshold + 1, threshold + 10) if rng.random() < violation_rate else (1, threshold)
+        events.extend(generate_person_journey(
+            person, force_after_hours=rng.random() < after_hours_rate, rng=rng, day=day,
+            zones_to_visit=zones, duration_range=duration_range
+        ))
+    return events
+
+def generate_chunk(task):
+    # Generates one chunk (a day for people [start, end)) and returns it as NDJSON text.
+    # Seeded per chunk, so output is identical whatever the number of worker processes.
+    day, start, end, seed, options = task
+    rng = random.Random(f"{seed}:chunk:{day.isoformat()}:{start}")
+    events = []
+    for index in range(start, end):
+        events.extend(generate_person_day(synthetic_person(index, seed), day, rng, **options))
+    events.sort(key=lambda e: e["timestamp"])
+    return "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events), len(events)
+
+def iter_chunk_tasks(people, days, start_date, seed, options, people_per_chunk=PEOPLE_PER_CHUNK):
+    for day_offset in range(days):
+        day = start_date + datetime.timedelta(days=day_offset)
+        for start in range(0, people, people_per_chunk):
+            yield day, start, min(start + people_per_chunk, people), seed, options
+
+def iter_load_events(people, days=1, start_date=datetime.date(2025, 11, 6), seed=0, **options):
+    # In-process event stream, for feeding benchmarks directly without going through a file.
+    for task in iter_chunk_tasks(people, days, start_date, seed, options):
+        text, _ = generate_chunk(task)
+        for line in text.splitlines():
+            yield json.loads(line)
+
+def write_load_dataset(output, people, days=1, start_date=datetime.date(2025, 11, 6), seed=0, workers=1, **options):
+    # Writes the dataset as NDJSON to `output` ("-" for stdout, *.gz for gzip). Returns the number of events written.
+    tasks = iter_chunk_tasks(people, days, start_date, seed, options)
+    if output != "-" and os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    if output == "-":
+        f = sys.stdout
+    elif output.endswith(".gz"):
+        f = gzip.open(output, "wt")
+    else:
+        f = open(output, "w")
+    total = 0
+    try:
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                # imap keeps chunk order while workers run ahead.
+                for text, count in pool.imap(generate_chunk, tasks):
+                    f.write(text)
+                    total += count
+        else:
+            for task in tasks:
+                text, count = generate_chunk(task)
+                f.write(text)
+                total += count
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a large synthetic warehouse event dataset as NDJSON.")
+    parser.add_argument("--people", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--start-date", type=datetime.date.fromisoformat, default=datetime.date(2025, 11, 6))
+    parser.add_argument("--zones-per-journey", type=int, default=2)
+    parser.add_argument("--journeys-per-day", type=int, default=1)
+    parser.add_argument("--violation-rate", type=float, default=0.2)
+    parser.add_argument("--after-hours-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", default="data/load_events.ndjson", help="NDJSON path, *.gz for gzip, or - for stdout")
+    args = parser.parse_args(argv)
+
+    total = write_load_dataset(
+        args.output, args.people, days=args.days, start_date=args.start_date, seed=args.seed, workers=args.workers,
+        zones_per_journey=args.zones_per_journey, journeys_per_day=args.journeys_per_day,
+        violation_rate=args.violation_rate, after_hours_rate=args.after_hours_rate
+    )
+    print(f"Wrote {total} events to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
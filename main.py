@@ -1,7 +1,13 @@
+import logging
+import os
 import uvicorn
-from app import app
 
 if __name__ == "__main__":
+    # LOG_LEVEL=DEBUG also logs every AI prompt and raw response.
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     # This is the main entry point for the web application.
     # It starts the Uvicorn server, which runs the FastAPI app.
+    # The app is imported here rather than at module level: the analysis worker processes (see sites.py) are
+    # spawned and re-import this module, and must not load FastAPI and the AI client each time.
+    from app import app
     uvicorn.run(app, host="0.0.0.0", port=8000)
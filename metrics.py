@@ -0,0 +1,135 @@
+import contextlib
+import threading
+import time
+
+# =========================
+# METRICS & TRACING
+# =========================
+# Process-wide counters and histograms, rendered in the Prometheus text format by GET /metrics,
+# plus an optional per-run Trace of stage timings that is returned in usage_stats.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = self._values or ({} if self.labelnames else {(): 0})
+            for key, value in sorted(values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), key + ('+Inf',))} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram("warehouse_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+AI_CALL_SECONDS = registry.histogram("warehouse_ai_call_seconds", "Wall time of AI calls, retries and rate-limit waits included.", ["kind"])
+AI_CALLS = registry.counter("warehouse_ai_calls_total", "AI calls by outcome (ok, cached, failed, malformed, circuit_open).", ["kind", "outcome"])
+AI_RETRIES = registry.counter("warehouse_ai_retries_total", "AI call attempts beyond the first.", ["kind"])
+AI_TOKENS = registry.counter("warehouse_ai_tokens_total", "Tokens spent on AI calls.", ["direction"])
+CACHE_LOOKUPS = registry.counter("warehouse_summary_cache_lookups_total", "Summary cache lookups by result (hit, miss).", ["result"])
+AI_HEDGED_REQUESTS = registry.counter("warehouse_ai_hedged_requests_total", "Second copies of AI requests sent because the first ran past the p95 latency.")
+AI_CIRCUIT_OPENED = registry.counter("warehouse_ai_circuit_opened_total", "Times the AI provider circuit breaker opened.")
+RATE_LIMIT_WAITS = registry.counter("warehouse_rate_limit_waits_total", "AI calls that had to wait for the rate limiter.")
+RATE_LIMIT_WAIT_SECONDS = registry.counter("warehouse_rate_limit_wait_seconds_total", "Time AI calls spent waiting for the rate limiter.")
+RUNS = registry.counter("warehouse_runs_total", "Completed pipeline runs.")
+EVENTS_PROCESSED = registry.counter("warehouse_events_processed_total", "Events analyzed by the pipeline.")
+
+class Trace:
+    # Ordered stage timings of one run; spans may be added from the summarization worker threads.
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, started=None, **attributes):
+        span = {"stage": stage, "ms": round(seconds * 1000, 3), **attributes}
+        if started is not None:
+            span["start_ms"] = round((started - self._start) * 1000, 3)
+        with self._lock:
+            self.spans.append(span)
+
+    def to_list(self):
+        with self._lock:
+            return sorted(self.spans, key=lambda span: span.get("start_ms", 0))
+
+@contextlib.contextmanager
+def timed(stage, trace=None, **attributes):
+    # Times the block into the stage histogram and, when a Trace is given, into the run's trace.
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if trace is not None:
+            trace.add(stage, elapsed, started, **attributes)
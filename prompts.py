@@ -0,0 +1,64 @@
+# =========================
+# INCIDENT PROMPTS
+# =========================
+# Prompt text for incident summaries. Kept apart from ai_openai so analysis workers (see sites.py)
+# can build prompts without importing the AI client.
+
+def get_incident_summary_prompt(person_id, authorized_zones, local_analysis, events):
+    # Generates the prompt for the AI to act as a storyteller for an incident.
+    event_text = "\n".join([f"{e['timestamp']} | {e['event_type']} in {e['zone']}" for e in events])
+    # NEW: Instruct the AI to use a placeholder.
+    return f"""A security analysis for person ID '{person_id}' has flagged violations with a risk score of {local_analysis['risk_score']}.
+This person is authorized for the following zones: {authorized_zones}.
+The detected violations are:
+- {local_analysis['issues']}
+
+Based on the full event log below, write a human-readable narrative summary and provide actionable recommendations.
+IMPORTANT: In your response, use the placeholder '[PERSON_NAME]' instead of the person's actual ID.
+
+Event Log:
+{event_text}
+
+Respond with a single JSON object with two keys:
+1. "summary": A narrative of the person's journey (e.g., "[PERSON_NAME] entered the warehouse at...").
+2. "recommendation": A list of brief, actionable steps (e.g., "Issue a formal warning to [PERSON_NAME]")."""
+
+def _incident_block(person_id, authorized_zones, local_analysis, events):
+    # The per-person part of a batched prompt.
+    event_text = "\n".join([f"{e['timestamp']} | {e['event_type']} in {e['zone']}" for e in events])
+    return f"""### Person ID '{person_id}'
+Risk score: {local_analysis['risk_score']}
+Authorized zones: {authorized_zones}
+Detected violations: {local_analysis['issues']}
+Event Log:
+{event_text}"""
+
+def get_batch_incident_summary_prompt(blocks):
+    # Generates one prompt covering several flagged people; the instructions are shared by all of them.
+    incidents_text = "\n\n".join(blocks)
+    return f"""A security analysis has flagged violations for the {len(blocks)} people below, each with a risk score, the zones they are authorized for, the detected violations and their full event log.
+
+For each person, write a human-readable narrative summary and provide actionable recommendations.
+IMPORTANT: In your response, use the placeholder '[PERSON_NAME]' instead of the person's actual ID.
+
+{incidents_text}
+
+Respond with a single JSON object with one key, "incidents": a list with exactly one object per person above, each with three keys:
+1. "person_id": The person ID exactly as given above.
+2. "summary": A narrative of the person's journey (e.g., "[PERSON_NAME] entered the warehouse at...").
+3. "recommendation": A list of brief, actionable steps (e.g., "Issue a formal warning to [PERSON_NAME]")."""
+
+def build_flagged_incidents(persons, events_by_person, local_analyses, batch_incidents=True):
+    # The flagged people, in person order, with everything their summary requests need.
+    flagged = []
+    for person_info in persons:
+        person_id = person_info["id"]
+        person_events = events_by_person.get(person_id)
+        local_analysis = local_analyses.get(person_id)
+        if person_events and local_analysis:
+            flagged.append({
+                "person_id": person_id, "person_info": person_info, "local_analysis": local_analysis,
+                "prompt": get_incident_summary_prompt(person_id, person_info["authorized_zones"], local_analysis, person_events),
+                "block": _incident_block(person_id, person_info["authorized_zones"], local_analysis, person_events) if batch_incidents else None
+            })
+    return flagged
@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+import numpy as np
+from config import RULES, RULES_FILE
+
+# =========================
+# CHECK KINDS
+# =========================
+# Each check kind has two factories taking the rule spec from config:
+#   scalar(spec) -> fn(event) -> bool              used by the per-event / streaming analyzers
+#   vector(spec) -> fn(columns) -> bool ndarray    used by the batch engine (see analyzer.events_to_columns)
+CHECKS = {}
+
+def register_check(name, scalar, vector):
+    # Makes a new check kind available to rules declared in config or the rules file.
+    CHECKS[name] = (scalar, vector)
+
+def _unauthorized_scalar(spec):
+    # Events without an "authorized" field count as authorized, as in the batch engine.
+    return lambda event: not event.get("authorized", True)
+
+def _unauthorized_vector(spec):
+    return lambda columns: ~columns["authorized"]
+
+def _overstay_scalar(spec):
+    threshold = spec.get("threshold_minutes", 5)
+    return lambda event: event.get("duration_minutes", 0) > event.get("allowed_minutes", threshold)
+
+def _overstay_vector(spec):
+    threshold = spec.get("threshold_minutes", 5)
+    # Events without their own allowed_minutes (NaN in the column) fall back to the rule threshold.
+    return lambda columns: columns["duration"] > np.where(np.isnan(columns["allowed"]), threshold, columns["allowed"])
+
+def _outside_hours_scalar(spec):
+    opening, closing = spec.get("opening_hour", 8), spec.get("closing_hour", 18)
+    def check(event):
+        hour = int(event["timestamp"][11:13])
+        return hour < opening or hour >= closing
+    return check
+
+def _outside_hours_vector(spec):
+    opening, closing = spec.get("opening_hour", 8), spec.get("closing_hour", 18)
+    return lambda columns: (columns["hour"] < opening) | (columns["hour"] >= closing)
+
+def _zone_in_scalar(spec):
+    zones = frozenset(spec["zones"])
+    return lambda event: event["zone"] in zones
+
+def _zone_in_vector(spec):
+    zones = list(spec["zones"])
+    return lambda columns: np.isin(columns["zone"], zones)
+
+register_check("unauthorized", _unauthorized_scalar, _unauthorized_vector)
+register_check("overstay", _overstay_scalar, _overstay_vector)
+register_check("outside_hours", _outside_hours_scalar, _outside_hours_vector)
+register_check("zone_in", _zone_in_scalar, _zone_in_vector)
+
+DEDUPE_POLICIES = ("none", "once_per_journey", "once_per_zone")
+
+# =========================
+# COMPILED RULES
+# =========================
+
+class Rule:
+    # A rule compiled from its declarative spec; `index` is its position in the registry.
+    __slots__ = ("name", "description", "penalty", "event_types", "dedupe", "check", "vector_check", "index")
+
+    def __init__(self, name, spec, index=0):
+        kind = spec.get("check")
+        if kind not in CHECKS:
+            raise ValueError(f"Rule '{name}' uses unknown check '{kind}'. Known checks: {sorted(CHECKS)}")
+        dedupe = spec.get("dedupe", "none")
+        if dedupe not in DEDUPE_POLICIES:
+            raise ValueError(f"Rule '{name}' uses unknown dedupe policy '{dedupe}'. Known policies: {DEDUPE_POLICIES}")
+        scalar, vector = CHECKS[kind]
+        self.name = name
+        self.description = spec.get("description", "")
+        self.penalty = spec.get("penalty", 0)
+        self.event_types = frozenset(spec["event_types"]) if spec.get("event_types") else None
+        self.dedupe = dedupe
+        self.check = scalar(spec)
+        self.vector_check = vector(spec)
+        self.index = index
+
+    def dedupe_key(self, event):
+        # Key under which a hit is remembered for the rest of the journey, or None when every hit is reported.
+        if self.dedupe == "once_per_journey":
+            return self.name
+        if self.dedupe == "once_per_zone":
+            return (self.name, event["zone"])
+        return None
+
+class RuleRegistry:
+    # Compiles the rule specs once and evaluates only the rules relevant to each event type.
+    # Evaluation counters: the per-event path counts into per-thread lists (no lock or timer per predicate,
+    # it is the streaming hot path); batch evaluation times each rule once per batch and adds to the shared
+    # totals under the lock. stats() sums both.
+    def __init__(self, rules_config):
+        enabled = [(name, spec) for name, spec in rules_config.items() if spec.get("enabled", True)]
+        self.rules = [Rule(name, spec, index) for index, (name, spec) in enumerate(enabled)]
+        self.penalties = {rule.name: rule.penalty for rule in self.rules}
+        self._by_event_type = {}
+        self._totals = [[0, 0, 0.0] for _ in self.rules]  # [evaluations, hits, seconds] per rule
+        self._thread_counts = []  # one [evaluations, hits] list per rule for each thread that evaluated events
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _counts(self):
+        # This thread's per-event counters, registered on first use.
+        counts = getattr(self._local, "counts", None)
+        if counts is None:
+            counts = self._local.counts = [[0, 0] for _ in self.rules]
+            with self._lock:
+                self._thread_counts.append(counts)
+        return counts
+
+    def rules_for(self, event_type):
+        # Rules that apply to an event type, in declaration order; computed once per event type.
+        rules = self._by_event_type.get(event_type)
+        if rules is None:
+            rules = self._by_event_type[event_type] = tuple(r for r in self.rules if r.event_types is None or event_type in r.event_types)
+        return rules
+
+    def evaluate(self, event, reported):
+        # Returns the violations a single event triggers. `reported` holds the dedupe keys already hit on this journey.
+        violations = []
+        counts = self._counts()
+        for rule in self.rules_for(event["event_type"]):
+            key = rule.dedupe_key(event)
+            if key is not None and key in reported:
+                continue
+            rule_counts = counts[rule.index]
+            rule_counts[0] += 1
+            if rule.check(event):
+                rule_counts[1] += 1
+                if key is not None:
+                    reported.add(key)
+                violations.append({"type": rule.name, "zone": event["zone"], "timestamp": event["timestamp"]})
+        return violations
+
+    def evaluate_columns(self, columns):
+        # Batch evaluation: returns, per rule, the positions of the events that violate it after dedupe.
+        person_idx = columns["person_idx"]
+        hits_per_rule = []
+        for rule in self.rules:
+            start = time.perf_counter()
+            mask = rule.vector_check(columns)
+            if rule.event_types is not None:
+                mask = mask & np.isin(columns["event_type"], list(rule.event_types))
+            hits = np.flatnonzero(mask)
+            if rule.dedupe == "once_per_journey":
+                hits = hits[np.unique(person_idx[hits], return_index=True)[1]]
+            elif rule.dedupe == "once_per_zone":
+                keys = person_idx[hits] * (int(columns["zone_idx"].max()) + 1) + columns["zone_idx"][hits]
+                hits = hits[np.unique(keys, return_index=True)[1]]
+            seconds = time.perf_counter() - start
+            with self._lock:
+                totals = self._totals[rule.index]
+                totals[0] += len(person_idx)
+                totals[1] += len(hits)
+                totals[2] += seconds
+            hits_per_rule.append(hits)
+        return hits_per_rule
+
+    def merge_stats(self, stats):
+        # Adds counters gathered elsewhere (e.g. by a worker process's copy of the rules, see sites.py) to the totals.
+        with self._lock:
+            for rule in self.rules:
+                if rule.name in stats:
+                    totals = self._totals[rule.index]
+                    totals[0] += stats[rule.name]["evaluations"]
+                    totals[1] += stats[rule.name]["hits"]
+                    totals[2] += stats[rule.name]["seconds"]
+
+    def stats(self):
+        # Per-rule evaluation counters, for profiling the rule set. `seconds` is the time spent in batch evaluation;
+        # per-event evaluations are counted but not timed.
+        with self._lock:
+            stats = {}
+            for rule in self.rules:
+                evaluations, hits, seconds = self._totals[rule.index]
+                for counts in self._thread_counts:
+                    evaluations += counts[rule.index][0]
+                    hits += counts[rule.index][1]
+                stats[rule.name] = {"evaluations": evaluations, "hits": hits, "seconds": round(seconds, 6)}
+        return stats
+
+def load_rules(rules_file=RULES_FILE):
+    # The rules from config, extended/overridden by the optional JSON rules file.
+    rules = dict(RULES)
+    if rules_file:
+        with open(rules_file) as f:
+            rules.update(json.load(f))
+    return rules
+
+default_registry = RuleRegistry(load_rules())
@@ -0,0 +1,23 @@
+import threading
+
+class RunRecord:
+    # Intermediate artifacts of one pipeline run (grouped events, local analyses, prompts and every AI
+    # exchange), carried forward so debug/audit dumps never have to recompute them.
+    def __init__(self, run_id=None):
+        self.run_id = run_id
+        self.events = []
+        self.events_by_person = {}
+        self.local_analyses = {}
+        self.prompts = {}
+        self.exchanges = []
+        self._lock = threading.Lock()
+
+    def record_exchange(self, system_message, prompt, raw_response, usage=None, attempts=0, cached=False):
+        # Called from the summarization worker threads, once per AI call (cache hits included).
+        exchange = {
+            "system_message": system_message, "prompt": prompt, "raw_response": raw_response,
+            "input_tokens": usage.prompt_tokens if usage else 0, "output_tokens": usage.completion_tokens if usage else 0,
+            "attempts": attempts, "cached": cached
+        }
+        with self._lock:
+            self.exchanges.append(exchange)
@@ -0,0 +1,110 @@
+import datetime
+import gzip
+import itertools
+import json
+import operator
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# =========================
+# RESPONSE ENCODING
+# =========================
+# Serialization for the analysis results: a fast JSON encoder, top-level field projection, a compact
+# columnar encoding of the event list and gzip/brotli compression of the finished body.
+
+# Bodies smaller than this are sent uncompressed; the headers would eat most of the saving.
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# Brotli's fast levels compress better than gzip at a similar speed; the top levels are far too slow per request.
+BROTLI_QUALITY = 5
+
+EVENT_ENCODINGS = ("rows", "columnar")
+
+def dumps(obj):
+    # Compact JSON bytes; orjson when installed, the standard library otherwise.
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def parse_fields(fields, available):
+    # "analysis,usage_stats" -> ["analysis", "usage_stats"], or None for everything. Raises ValueError on an unknown field.
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}")
+    return names
+
+def project(result, names):
+    # Keeps only the named top-level keys of a result (all of them when names is None).
+    if names is None:
+        return result
+    return {name: result[name] for name in names if name in result}
+
+def _epoch_ms(timestamps):
+    # ISO 8601 timestamps -> epoch milliseconds, naive ones read as UTC; None if any value isn't a timestamp.
+    if not all(isinstance(value, str) for value in timestamps):
+        return None
+    try:
+        if not any(value.endswith("Z") or "+" in value[19:] or "-" in value[19:] for value in timestamps):
+            return np.array(timestamps, dtype="datetime64[ms]").astype(np.int64).tolist()
+        # Timestamps with UTC offsets: NumPy has no time zones, so convert them one by one.
+        parsed = (datetime.datetime.fromisoformat(value) for value in timestamps)
+        return [round((dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)).timestamp() * 1000) for dt in parsed]
+    except ValueError:
+        return None
+
+def encode_events_columnar(events):
+    # Column-per-key encoding of an event list. Timestamps become epoch milliseconds (naive timestamps are
+    # read as UTC); string columns become a dictionary of distinct values plus integer codes (-1 where an
+    # event lacks the key); any other column is a plain array with nulls where the key is missing.
+    keys = list(dict.fromkeys(itertools.chain.from_iterable(events)))
+    columns = {}
+    for key in keys:
+        try:
+            values = list(map(operator.itemgetter(key), events))
+        except KeyError:
+            values = [event.get(key) for event in events]
+        epoch_ms = _epoch_ms(values) if key == "timestamp" else None
+        if epoch_ms is not None:
+            columns[key] = {"epoch_ms": epoch_ms}
+        elif set(map(type, values)) <= {str, type(None)}:
+            dictionary = [value for value in dict.fromkeys(values) if value is not None]
+            codes = {value: code for code, value in enumerate(dictionary)}
+            codes[None] = -1
+            columns[key] = {"dictionary": dictionary, "codes": list(map(codes.__getitem__, values))}
+        else:
+            columns[key] = {"values": values}
+    return {"encoding": "columnar", "count": len(events), "columns": columns}
+
+def decode_events_columnar(encoded):
+    # Inverse of encode_events_columnar, for Python clients. Timestamps come back as naive UTC isoformat strings.
+    columns = {}
+    for key, column in encoded["columns"].items():
+        if "epoch_ms" in column:
+            columns[key] = [value.isoformat() for value in np.array(column["epoch_ms"], dtype="datetime64[ms]").astype(object)]
+        elif "dictionary" in column:
+            columns[key] = [column["dictionary"][code] if code >= 0 else None for code in column["codes"]]
+        else:
+            columns[key] = column["values"]
+    return [{key: values[i] for key, values in columns.items() if values[i] is not None} for i in range(encoded["count"])]
+
+def compress(body, accept_encoding):
+    # Compresses a response body for the client's Accept-Encoding. Returns (body, content encoding or None).
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if brotli and "br" in accept_encoding:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accept_encoding:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
@@ -0,0 +1,187 @@
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from config import SITES_FILE
+from layout import default_layout
+from event_generator import PERSONS
+from rules import RuleRegistry, default_registry, load_rules
+from analyzer import analyze_events_batch
+from ingest import iter_ndjson
+from prompts import build_flagged_incidents
+
+# =========================
+# SITES & SHARDED ANALYSIS
+# =========================
+# A site is one warehouse with its own layout, personnel and rules. Events carry a site_id (events
+# without one, or with a null one, belong to the default site, which is the one described in config).
+# Local analysis is sharded by site and, within a site, by person across a process pool: a person's
+# whole journey always lands in one shard, so shard results are simply merged.
+#
+# Workers are handed raw NDJSON bytes, never parsed events: pickling event dicts to a worker costs
+# more than analyzing them. A first pass buckets lines by site and person shard with a regex, a
+# second parses, analyzes and builds the prompts of each shard, so only flagged incidents travel back.
+
+DEFAULT_SITE_ID = "default"
+ANALYSIS_WORKERS = os.cpu_count() or 1
+# Smaller bodies are analyzed in-process; below this, worker round-trips cost more than they save.
+SHARD_MIN_BYTES = 4 << 20
+ROUTE_CHUNK_BYTES = 4 << 20
+
+PERSON_ID_FIELD = re.compile(rb'"person_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+SITE_ID_FIELD = re.compile(rb'"site_id"\s*:\s*(?:"((?:[^"\\]|\\.)*)"|null)')
+
+class Site:
+    def __init__(self, site_id, name=None, layout=None, persons=None, rules=None, registry=None):
+        self.site_id = site_id
+        self.name = name or site_id
+        self._layout = layout
+        self.persons = persons if persons is not None else PERSONS
+        self.rules = rules or load_rules()
+        self.registry = registry or RuleRegistry(self.rules)
+        # What workers need, rebuilt once per process (see _analyze_shard). Key order is rule order, so it is not sorted.
+        self.spec_json = json.dumps({"rules": self.rules, "persons": self.persons})
+
+    @property
+    def layout(self):
+        # Without a layout of its own, a site follows the config layout, runtime edits included.
+        return self._layout or default_layout()
+
+    def to_dict(self):
+        return {"site_id": self.site_id, "name": self.name, "persons": len(self.persons), "rules": sorted(self.rules)}
+
+class SiteRegistry:
+    def __init__(self, sites):
+        self._sites = {site.site_id: site for site in sites}
+
+    def get(self, site_id):
+        return self._sites.get(site_id)
+
+    def __contains__(self, site_id):
+        return site_id in self._sites
+
+    def __iter__(self):
+        return iter(self._sites.values())
+
+def load_sites(sites_file=SITES_FILE):
+    # The default site from config, plus the sites in the optional JSON file:
+    # {"<site_id>": {"name": ..., "layout": {...}, "persons": [...], "rules": {...}}, ...}
+    # A site's layout keys override the config layout and its rules extend/override load_rules().
+    sites = [Site(DEFAULT_SITE_ID, "Default site", registry=default_registry)]
+    if sites_file:
+        with open(sites_file) as f:
+            specs = json.load(f)
+        sites = [site for site in sites if site.site_id not in specs]
+        for site_id, spec in specs.items():
+            sites.append(Site(
+                site_id, spec.get("name"), {**default_layout(), **spec.get("layout", {})},
+                spec.get("persons"), {**load_rules(), **spec.get("rules", {})}
+            ))
+    return SiteRegistry(sites)
+
+site_registry = load_sites()
+
+def split_ndjson(body, chunk_bytes=ROUTE_CHUNK_BYTES):
+    # Splits an NDJSON body into chunks of about chunk_bytes, on line boundaries.
+    start = 0
+    while start < len(body):
+        end = body.find(b"\n", start + chunk_bytes)
+        end = len(body) if end == -1 else end + 1
+        yield body[start:end]
+        start = end
+
+def _route_chunk(chunk, shards):
+    # Pass 1, in a worker: buckets a chunk's lines by site and person shard without parsing them.
+    # crc32 rather than hash(), which is salted differently in every process.
+    routed = {}
+    for line in chunk.split(b"\n"):
+        if not line.strip():
+            continue
+        person = PERSON_ID_FIELD.search(line)
+        if person is None:
+            raise ValueError(f"Event without a person_id: {line[:200]!r}")
+        site = SITE_ID_FIELD.search(line)
+        site_id = json.loads(b'"%s"' % site.group(1)) if site and site.group(1) is not None else DEFAULT_SITE_ID
+        routed.setdefault(site_id, [[] for _ in range(shards)])[zlib.crc32(person.group(1)) % shards].append(line)
+    return {site_id: [b"\n".join(lines) for lines in buckets] for site_id, buckets in routed.items()}
+
+@functools.lru_cache(maxsize=32)
+def _shard_site(spec_json):
+    spec = json.loads(spec_json)
+    return spec["persons"], RuleRegistry(spec["rules"])
+
+def _flag(events, persons, registry, batch_incidents):
+    events_by_person = {}
+    for event in events:
+        events_by_person.setdefault(event["person_id"], []).append(event)
+    return build_flagged_incidents(persons, events_by_person, analyze_events_batch(events, registry), batch_incidents)
+
+def _analyze_shard(spec_json, ndjson, batch_incidents):
+    # Pass 2, in a worker: parses one shard, analyzes it and builds its flagged incidents. Also returns the
+    # rule counters this shard added to the worker's registry, for the parent to merge into the site's.
+    persons, registry = _shard_site(spec_json)
+    before = registry.stats()
+    events = list(iter_ndjson(ndjson.split(b"\n")))
+    flagged = _flag(events, persons, registry, batch_incidents)
+    rule_stats = {name: {key: value - before[name][key] for key, value in counters.items()} for name, counters in registry.stats().items()}
+    return flagged, len(events), rule_stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool(workers):
+    # One long-lived pool, so worker start-up and rule compilation are paid once. Spawned rather than
+    # forked: the server process has threads (jobs, AI calls) that a fork would copy mid-flight.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _check_sites(site_ids, sites):
+    unknown = sorted(str(site_id) for site_id in site_ids if site_id not in sites)
+    if unknown:
+        raise ValueError(f"Unknown site(s): {', '.join(unknown)}")
+
+def _analyze_in_process(body, sites, batch_incidents):
+    events_by_site = {}
+    for event in iter_ndjson(body.split(b"\n")):
+        site_id = event.get("site_id")
+        events_by_site.setdefault(DEFAULT_SITE_ID if site_id is None else site_id, []).append(event)
+    _check_sites(events_by_site, sites)
+    return {site_id: (_flag(events, sites.get(site_id).persons, sites.get(site_id).registry, batch_incidents), len(events))
+            for site_id, events in events_by_site.items()}
+
+def analyze_sites(body, sites=site_registry, workers=ANALYSIS_WORKERS, batch_incidents=True):
+    # Local analysis of an NDJSON body of events from any number of sites.
+    # Returns {site_id: (flagged incidents in person order, number of events)}.
+    if workers <= 1 or len(body) < SHARD_MIN_BYTES:
+        return _analyze_in_process(body, sites, batch_incidents)
+    pool = _get_pool(workers)
+    shards = {}  # site_id -> per-shard list of byte buckets, in body order
+    for routed in pool.map(_route_chunk, split_ndjson(body), itertools.repeat(workers)):
+        for site_id, buckets in routed.items():
+            parts = shards.setdefault(site_id, [[] for _ in range(workers)])
+            for shard, bucket in enumerate(buckets):
+                if bucket:
+                    parts[shard].append(bucket)
+    _check_sites(shards, sites)
+
+    futures = [(site_id, pool.submit(_analyze_shard, sites.get(site_id).spec_json, b"\n".join(parts), batch_incidents))
+               for site_id, site_shards in shards.items() for parts in site_shards if parts]
+    flagged, counts = {site_id: [] for site_id in shards}, dict.fromkeys(shards, 0)
+    for site_id, future in futures:
+        shard_flagged, count, rule_stats = future.result()
+        sites.get(site_id).registry.merge_stats(rule_stats)
+        flagged[site_id] += shard_flagged
+        counts[site_id] += count
+    results = {}
+    for site_id in shards:
+        order = {person["id"]: i for i, person in enumerate(sites.get(site_id).persons)}
+        results[site_id] = (sorted(flagged[site_id], key=lambda item: order[item["person_id"]]), counts[site_id])
+    return results
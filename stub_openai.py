@@ -0,0 +1,117 @@
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =========================
+# STUB OPENAI SERVER
+# =========================
+# A local stand-in for the chat completions API. It answers incident, batch and daily-summary
+# prompts with well-formed JSON so the pipeline can be measured without network access, and can
+# inject latency and failures to exercise the client's retry behaviour.
+
+class StubConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, malformed_rate=0.0, retry_after=1, seed=0,
+                 slow_rate=0.0, slow_latency=5.0):
+        self.latency = latency                  # seconds added to every response
+        self.jitter = jitter                    # extra uniform random latency, seconds
+        self.slow_rate = slow_rate              # share of requests that also get slow_latency (a latency tail, for hedging)
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate            # share of requests answered with HTTP 500
+        self.rate_limit_rate = rate_limit_rate  # share of requests answered with HTTP 429 + Retry-After
+        self.malformed_rate = malformed_rate    # share of requests answered with content that is not JSON
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def _completion_content(prompt):
+    # Builds a plausible JSON answer for whichever prompt type was sent.
+    if '"incidents"' in prompt:
+        person_ids = re.findall(r"### Person ID '([^']+)'", prompt)
+        return json.dumps({"incidents": [
+            {"person_id": pid, "summary": "[PERSON_NAME] triggered the flagged violations.", "recommendation": ["Review access for [PERSON_NAME]"]}
+            for pid in person_ids
+        ]})
+    if "actionable_items" in prompt:
+        return json.dumps({
+            "summary": {"offenders": [], "hot_spot_zones": [], "common_violations": []},
+            "actionable_items": [{"action": "Review today's incidents", "details": "Generated by the stub server."}]
+        })
+    return json.dumps({"summary": "[PERSON_NAME] triggered the flagged violations.", "recommendation": ["Review access for [PERSON_NAME]"]})
+
+def make_handler(config):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with config.lock:
+                config.requests += 1
+                roll = config.rng.random()
+                delay = config.latency + config.rng.random() * config.jitter
+                if config.rng.random() < config.slow_rate:
+                    delay += config.slow_latency
+            if not self.path.rstrip("/").endswith("chat/completions"):
+                return self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            time.sleep(delay)
+
+            if roll < config.rate_limit_rate:
+                return self._send(429, {"error": {"message": "Rate limited by stub", "type": "rate_limit_error"}}, {"Retry-After": str(config.retry_after)})
+            roll -= config.rate_limit_rate
+            if roll < config.error_rate:
+                return self._send(500, {"error": {"message": "Injected stub failure", "type": "server_error"}})
+            roll -= config.error_rate
+
+            messages = request.get("messages", [])
+            prompt = messages[-1]["content"] if messages else ""
+            content = "this is not json" if roll < config.malformed_rate else _completion_content(prompt)
+            prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+            completion_tokens = _estimate_tokens(content)
+            self._send(200, {
+                "id": f"chatcmpl-stub-{config.requests}", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+            })
+    return StubHandler
+
+def start_stub_server(port=0, **options):
+    # Starts the stub on a background thread; returns (server, config, base_url). Stop it with server.shutdown().
+    config = StubConfig(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    # Usage: python stub_openai.py [port] [latency_seconds] [error_rate]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8001
+    server, _, base_url = start_stub_server(
+        port, latency=float(sys.argv[2]) if len(sys.argv) > 2 else 0.0, error_rate=float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    )
+    print(f"Stub OpenAI server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
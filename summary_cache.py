@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = "data/summary_cache.sqlite3"
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_ENTRIES = 5000
+
+def normalize_prompt(prompt):
+    # Collapses whitespace so cosmetic prompt changes (indentation, trailing newlines) still hit the cache.
+    return " ".join(prompt.split())
+
+def cache_key(model, system_message, prompt):
+    payload = json.dumps([model, normalize_prompt(system_message), normalize_prompt(prompt)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CacheCounter:
+    # Per-run hit/miss counters, safe to update from the summarization worker threads.
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit: self.hits += 1
+            else: self.misses += 1
+
+    def to_dict(self):
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+class SummaryCache:
+    # Content-addressed store of parsed AI responses with a TTL and size-bounded LRU eviction.
+    def __init__(self, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries(last_used)")
+        return self._conn
+
+    def get(self, model, system_message, prompt):
+        # Returns the cached response object, or None on a miss or an expired entry.
+        key = cache_key(model, system_message, prompt)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM summaries WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, model, system_message, prompt, response):
+        key = cache_key(model, system_message, prompt)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response), now, now)
+            )
+            self._evict(conn, now)
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM summaries")
+
+    def _evict(self, conn, now):
+        # Drops expired entries, then the least recently used ones beyond max_entries.
+        conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
@@ -0,0 +1,78 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from ai_client import AIClient, CircuitBreaker, HedgeLosers, ProviderError, CircuitOpenError, HEDGE_MIN_SAMPLES
+from stub_openai import start_stub_server
+
+@pytest.fixture
+def stub():
+    # start(**StubConfig options) -> (config, base_url); every server started is shut down afterwards.
+    servers = []
+    def start(**options):
+        server, config, base_url = start_stub_server(**options)
+        servers.append(server)
+        return config, base_url
+    yield start
+    for server in servers:
+        server.shutdown()
+
+def test_rate_limited_calls_honour_retry_after(stub):
+    config, base_url = stub(rate_limit_rate=1.0, retry_after=0.3)
+    client = AIClient("stub", base_url, hedge=False, max_attempts=2)
+    started = time.perf_counter()
+    with pytest.raises(ProviderError) as error:
+        client.complete_json("stub", "system", "prompt")
+    assert error.value.attempts == 2 and config.requests == 2
+    assert time.perf_counter() - started >= 0.3
+
+def test_intermittent_errors_are_retried_until_success(stub):
+    config, base_url = stub(error_rate=0.3, seed=1)
+    client = AIClient("stub", base_url, hedge=False)
+    attempts = [client.complete_json("stub", "system", "prompt")[3] for _ in range(10)]
+    assert config.requests == sum(attempts) > 10
+
+def test_breaker_opens_fails_fast_and_closes_after_a_trial_call(stub):
+    config, base_url = stub(error_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.5)
+    client = AIClient("stub", base_url, breaker=breaker, hedge=False, max_attempts=2)
+    with pytest.raises(ProviderError):
+        client.complete_json("stub", "system", "prompt")
+    assert breaker.state == "open"
+    requests = config.requests
+    with pytest.raises(CircuitOpenError):
+        client.complete_json("stub", "system", "prompt")
+    assert config.requests == requests
+    config.error_rate = 0.0
+    time.sleep(0.5)
+    client.complete_json("stub", "system", "prompt")
+    assert breaker.state == "closed"
+
+def test_unexpected_errors_settle_a_half_open_breaker():
+    # A response without choices becomes a ProviderError, and the half-open trial doesn't stay in flight.
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    client = AIClient("stub", "http://127.0.0.1:9", breaker=breaker, hedge=False)
+    client.openai.chat.completions.create = lambda **kwargs: SimpleNamespace(choices=[], usage=None)
+    breaker.record_failure()
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            client.complete_json("stub", "system", "prompt")
+        assert breaker.state == "open" and not breaker._trial_in_flight
+
+def test_slow_requests_are_hedged_and_the_loser_is_counted(stub):
+    config, base_url = stub(slow_rate=1.0, slow_latency=2.0)
+    client = AIClient("stub", base_url)
+    for _ in range(HEDGE_MIN_SAMPLES):
+        client.latency.add(0.01)  # recent p95 well under HEDGE_MIN_DELAY_SECONDS, so the hedge fires at the minimum delay
+    def speed_up_after_first_request():
+        while config.requests < 1:
+            time.sleep(0.01)
+        config.slow_rate = 0.0
+    threading.Thread(target=speed_up_after_first_request, daemon=True).start()
+    usages, loser_done = [], threading.Event()
+    losers = HedgeLosers(lambda usage: (usages.append(usage), loser_done.set()))
+    started = time.perf_counter()
+    client.complete_json("stub", "system", "prompt", hedge_losers=losers)
+    assert time.perf_counter() - started < 2.0
+    assert config.requests == 2
+    assert loser_done.wait(5) and len(usages) == 1
@@ -0,0 +1,51 @@
+import random
+import pytest
+from analyzer import analyze_person_journey_locally, analyze_events_batch
+from ingest import IncrementalAnalyzer
+from load_generator import iter_load_events
+
+def interleave_events(events, seed=0):
+    # Randomly interleaves people's events while keeping each person's own events in order.
+    queues = {}
+    for event in events:
+        queues.setdefault(event["person_id"], []).append(event)
+    order = [event["person_id"] for event in events]
+    random.Random(seed).shuffle(order)
+    positions = dict.fromkeys(queues, 0)
+    interleaved = []
+    for person_id in order:
+        interleaved.append(queues[person_id][positions[person_id]])
+        positions[person_id] += 1
+    return interleaved
+
+def group_by_person(events):
+    by_person = {}
+    for event in events:
+        by_person.setdefault(event["person_id"], []).append(event)
+    return by_person
+
+@pytest.mark.parametrize("people", [100, 1000])
+def test_batch_engine_matches_per_person_analyzer(people):
+    # Whatever order people's events are interleaved in, the batch engine gives exactly what the per-person analyzer gives.
+    events = interleave_events(list(iter_load_events(people)))
+    batch = analyze_events_batch(events)
+    for person_id, person_events in group_by_person(events).items():
+        assert batch.get(person_id) == analyze_person_journey_locally(person_events), person_id
+
+def test_incremental_analyzer_matches_batch_engine():
+    events = interleave_events(list(iter_load_events(200)), seed=1)
+    analyzer = IncrementalAnalyzer(max_violations=None)
+    for event in events:
+        analyzer.process(event)
+    batch = {person_id: analysis for person_id, analysis in analyze_events_batch(events).items() if analysis}
+    assert analyzer.results() == batch
+
+def test_engines_agree_on_events_without_authorized():
+    # A missing "authorized" field counts as authorized on both paths.
+    events = [
+        {"timestamp": "2025-11-06T10:00:00", "person_id": "P1", "zone": "Vault", "event_type": "person_entered"},
+        {"timestamp": "2025-11-06T10:09:00", "person_id": "P1", "zone": "Vault", "event_type": "person_exited", "duration_minutes": 9},
+    ]
+    expected = analyze_person_journey_locally(events)
+    assert [v["type"] for v in expected["violations"]] == ["loitering"]
+    assert analyze_events_batch(events)["P1"] == expected
@@ -0,0 +1,25 @@
+import os
+import time
+
+from artifacts import ArtifactStore
+
+def test_cleanup_keeps_unfinished_runs_within_retention(tmp_path):
+    store = ArtifactStore(root=str(tmp_path), retention_seconds=3600, max_runs=1)
+    old_done = store.create_run()
+    store.complete(old_done, b"{}")
+    in_progress = store.create_run()
+    store.write(in_progress, "a.json", b"{}")
+    new_done = store.create_run()
+    store.complete(new_done, b"{}")
+
+    assert store.cleanup() == [old_done]
+    assert store.runs() == [in_progress, new_done]
+
+def test_cleanup_removes_unfinished_runs_after_retention(tmp_path):
+    store = ArtifactStore(root=str(tmp_path), retention_seconds=3600, max_runs=10)
+    stale = store.create_run()
+    past = time.time() - 7200
+    os.utime(store.run_dir(stale), (past, past))
+
+    assert store.cleanup() == [stale]
+    assert store.runs() == []
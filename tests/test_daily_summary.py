@@ -0,0 +1,26 @@
+from daily_summary import DailySummarizer
+from ingest import IncrementalAnalyzer
+
+def upload(*events):
+    # The incidents one /ingest?summarize=true upload folds into the day's report.
+    analyzer = IncrementalAnalyzer()
+    for event in events:
+        analyzer.process(event)
+    return [{"person_id": person_id, **analysis} for person_id, analysis in analyzer.results().items()]
+
+def vault_entry(hour):
+    return {"timestamp": f"2025-11-06T{hour:02d}:00:00", "person_id": "P1", "zone": "Vault", "event_type": "person_entered", "authorized": False}
+
+def test_repeat_violations_from_two_uploads_both_count():
+    summarizer = DailySummarizer()
+    assert summarizer.prepare(upload(vault_entry(10))) is not None
+    assert summarizer.prepare(upload(vault_entry(11))) is not None
+    assert summarizer.aggregates.type_counts["unauthorized_access"] == 2
+    assert summarizer.aggregates.zone_counts["Vault"] == 2
+
+def test_adding_the_same_upload_again_changes_nothing():
+    summarizer = DailySummarizer()
+    incidents = upload(vault_entry(10))
+    summarizer.prepare(incidents)
+    assert summarizer.prepare(incidents) is None
+    assert summarizer.aggregates.type_counts["unauthorized_access"] == 1
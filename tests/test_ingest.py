@@ -0,0 +1,31 @@
+from ingest import IncrementalAnalyzer
+
+SERVER_ROOM, WALKWAY = [4, 22], [8, 15]
+
+def _samples(person_id, track):
+    return [{"person_id": person_id, "timestamp": f"2025-11-06T10:{minute:02d}:00", "position": point} for minute, point in track]
+
+def test_position_samples_are_resolved_to_zone_events():
+    # Charlie has no authorized zones and stays 20 minutes in the Server Room; Bob may enter it.
+    feed = _samples("P3", [(0, WALKWAY), (1, SERVER_ROOM), (10, SERVER_ROOM), (21, WALKWAY)])
+    feed += _samples("P2", [(0, WALKWAY), (2, SERVER_ROOM), (3, WALKWAY)])
+    analyzer = IncrementalAnalyzer(position_batch_size=3)
+    updates = list(analyzer.consume(sorted(feed, key=lambda s: s["timestamp"])))
+
+    summary = analyzer.summary()
+    assert summary["positions_processed"] == len(feed)
+    assert summary["events_processed"] == 4
+    assert set(summary["analysis"]) == {"P3"}
+    assert summary["analysis"]["P3"]["violations"] == [
+        {"type": "unauthorized_access", "zone": "Server Room", "timestamp": "2025-11-06T10:01:00"},
+        {"type": "loitering", "zone": "Server Room", "timestamp": "2025-11-06T10:21:00"},
+    ]
+    assert [update["timestamp"] for update in updates] == ["2025-11-06T10:01:00", "2025-11-06T10:21:00"]
+
+def test_labelled_events_flush_pending_samples_first():
+    analyzer = IncrementalAnalyzer()
+    assert analyzer.feed(_samples("P3", [(1, SERVER_ROOM)])[0]) == []
+    updates = analyzer.feed({"timestamp": "2025-11-06T10:02:00", "person_id": "P3", "person_name": "Charlie",
+                             "zone": "Entrance", "event_type": "exit_warehouse"})
+    assert [update["timestamp"] for update in updates] == ["2025-11-06T10:01:00"]
+    assert analyzer.events_processed == 2
@@ -0,0 +1,36 @@
+import time
+
+from jobs import JobManager
+
+def _wait(job):
+    while not job.done:
+        time.sleep(0.01)
+
+def test_finished_job_keeps_only_the_result_message():
+    manager = JobManager(max_workers=1)
+
+    def run(job):
+        job.publish("events", list(range(1000)))
+        job.publish("incident", {"id": 1})
+        return {"analysis": []}
+
+    job = manager.submit(run)
+    _wait(job)
+
+    messages, finished = job.messages_since(0)
+    assert finished
+    assert messages == [("result", {"analysis": []})]
+    assert job.messages_since(2) == ([("result", {"analysis": []})], True)
+    assert job.to_status()["messages"] == 4
+
+def test_failed_job_keeps_only_the_failure_message():
+    manager = JobManager(max_workers=1)
+
+    def run(job):
+        job.publish("incident", {"id": 1})
+        raise RuntimeError("boom")
+
+    job = manager.submit(run)
+    _wait(job)
+
+    assert job.messages_since(0) == ([("failed", {"error": "boom"})], True)
@@ -0,0 +1,140 @@
+import functools
+import json
+import numpy as np
+import config
+from layout import build_warehouse_matrix, default_layout, _config_signature
+
+# =========================
+# ZONE RESOLUTION
+# =========================
+# Camera feeds report positions, not zone names. ZoneIndex precomputes a label grid the size of the
+# layout matrix (cell -> zone id, painted in the same order as build_warehouse_matrix so overlaps
+# resolve the way the floor plan is drawn) and resolves whole batches of points with one NumPy
+# gather. ZoneTracker turns coordinate tracks into the person_entered / person_exited events the
+# analyzer consumes.
+
+NO_ZONE = 0  # walkway cells and points outside the floor plan
+
+class ZoneIndex:
+    def __init__(self, scale=1, layout=None):
+        # scale: coordinate units per layout cell, e.g. 10 when positions are reported in tenths of a cell.
+        # layout: a site layout (see layout.default_layout); the config layout when omitted.
+        layout = layout or default_layout()
+        warehouse, _ = build_warehouse_matrix(layout)
+        self.layout = layout
+        self.scale = scale
+        self.rows, self.cols = warehouse.shape
+        self.names = [None]
+        self.centers = [None]
+        self.labels = np.full(warehouse.shape, NO_ZONE, dtype=np.int16)
+        areas = [(area["name"], area) for area in layout["restricted_areas"]]
+        areas += [(area.get("name", f"Safe Area {i + 1}"), area) for i, area in enumerate(layout["safe_areas"])]
+        for name, area in areas:
+            r1, c1 = area["top_left"]
+            r2, c2 = area["bottom_right"]
+            self.labels[r1:r2+1, c1:c2+1] = len(self.names)
+            self.names.append(name)
+            self.centers.append(((r1 + r2) // 2, (c1 + c2) // 2))
+        self.zone_ids = {name: zone_id for zone_id, name in enumerate(self.names) if name}
+
+    def to_cells(self, points):
+        # (N, 2) row/col positions in coordinate units -> (N, 2) integer cell indices.
+        points = np.asarray(points)
+        if self.scale == 1 and np.issubdtype(points.dtype, np.integer):
+            return points.astype(np.intp, copy=False)
+        return np.floor(points / self.scale).astype(np.intp)
+
+    def resolve(self, points):
+        # Zone id of every point; points off the floor plan resolve to NO_ZONE.
+        cells = self.to_cells(points).reshape(-1, 2)
+        rows, cols = cells[:, 0], cells[:, 1]
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        zone_ids = np.full(len(cells), NO_ZONE, dtype=np.int16)
+        zone_ids[inside] = self.labels[rows[inside], cols[inside]]
+        return zone_ids
+
+    def resolve_names(self, points):
+        return [self.names[zone_id] for zone_id in self.resolve(points).tolist()]
+
+@functools.lru_cache(maxsize=16)
+def _build_index(signature, scale):
+    return ZoneIndex(scale, json.loads(signature))
+
+def get_zone_index(scale=1, layout=None):
+    # Shared index for a layout; rebuilt only when the zone config changes.
+    return _build_index(_config_signature(layout), scale)
+
+def default_tracked_zones(layout=None):
+    # Zones whose entries and exits become events. The entrance is covered by enter/exit_warehouse and safe areas are never flagged.
+    return [area["name"] for area in (layout or default_layout())["restricted_areas"] if area["name"] != "Entrance"]
+
+def loitering_threshold(rules=None):
+    # Minutes allowed in a tracked zone: the threshold of the rule set's overstay check (5 when it sets none, as in rules.py).
+    specs = (rules or config.RULES).values()
+    return next((spec.get("threshold_minutes", 5) for spec in specs if spec.get("check") == "overstay"), 5)
+
+class ZoneTracker:
+    # Derives person_entered / person_exited events from position samples, batch by batch.
+    # Zone resolution and change detection are vectorized over the batch; Python only runs per zone
+    # transition, which is orders of magnitude rarer than frames. State carries across batches, so a
+    # live feed can be fed in chunks.
+    def __init__(self, persons=(), index=None, tracked_zones=None, site=None):
+        # site: a sites.Site whose layout, personnel and rules apply; otherwise the tracked zones come from
+        # the index's layout and the loitering threshold from config.RULES.
+        if site:
+            persons = persons or site.persons
+            index = index or get_zone_index(layout=site.layout)
+        self.index = index or get_zone_index()
+        self.persons = {p["id"]: p for p in persons}
+        self.tracked = np.zeros(len(self.index.names), dtype=bool)
+        for name in tracked_zones or default_tracked_zones(self.index.layout):
+            self.tracked[self.index.zone_ids[name]] = True
+        self.allowed_minutes = loitering_threshold(site.rules if site else None)
+        self._state = {}  # person_id -> (zone_id, entered_at) of the current tracked stay
+
+    def update(self, person_ids, timestamps, points):
+        # person_ids, timestamps (datetime64 or ISO strings) and (N, 2) points, in any order.
+        # Returns the events this batch completes, in time order.
+        person_ids = np.asarray(person_ids)
+        timestamps = np.asarray(timestamps, dtype="datetime64[us]")
+        points = np.asarray(points)
+        if not len(person_ids):
+            return []
+        order = np.lexsort((timestamps, person_ids))
+        person_ids, timestamps, points = person_ids[order], timestamps[order], points[order]
+        zone_ids = self.index.resolve(points)
+        zone_ids[~self.tracked[zone_ids]] = NO_ZONE
+
+        # A sample is a transition when its zone differs from the previous sample of the same person
+        # (the first sample of each person in the batch is compared with the carried-over state).
+        previous = np.empty_like(zone_ids)
+        previous[1:] = zone_ids[:-1]
+        starts = np.flatnonzero(np.r_[True, person_ids[1:] != person_ids[:-1]])
+        previous[starts] = [self._state.get(pid, (NO_ZONE, None))[0] for pid in person_ids[starts].tolist()]
+        changes = np.flatnonzero(zone_ids != previous)
+
+        events = []
+        cells = self.index.to_cells(points)
+        for i in changes.tolist():
+            person_id = str(person_ids[i])
+            timestamp = timestamps[i].item()
+            zone_id, entered_at = self._state.get(person_id, (NO_ZONE, None))
+            if zone_id != NO_ZONE:
+                duration = round((timestamp - entered_at).total_seconds() / 60, 2)
+                events.append(self._event(person_id, zone_id, "person_exited", timestamp, self.index.centers[zone_id],
+                                          duration_minutes=duration, allowed_minutes=self.allowed_minutes))
+            zone_id = int(zone_ids[i])
+            if zone_id != NO_ZONE:
+                events.append(self._event(person_id, zone_id, "person_entered", timestamp, cells[i]))
+            self._state[person_id] = (zone_id, timestamp)
+        events.sort(key=lambda e: e["timestamp"])
+        return events
+
+    def _event(self, person_id, zone_id, event_type, timestamp, coords, **extra):
+        person = self.persons.get(person_id, {})
+        zone = self.index.names[zone_id]
+        return {
+            "timestamp": timestamp.isoformat(), "person_id": person_id, "person_name": person.get("name", person_id),
+            "zone": zone, "event_type": event_type, "authorized": zone in person.get("authorized_zones", ()),
+            "coords": (int(coords[0]), int(coords[1])), **extra
+        }